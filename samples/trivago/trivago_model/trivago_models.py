@@ -29,8 +29,6 @@ class TestModel(nn.Module):
     ):
 
         super(TestModel, self).__init__()
-        self.weight_init = weight_init
-        self.apply(self.init_weights)
 
         self.user_embeddings = nn.Embedding(n_users, n_factors)
         self.item_embeddings = nn.Embedding(n_items, n_factors)
@@ -53,8 +51,11 @@ class TestModel(nn.Module):
         weight_init(self.item_embeddings.weight)
         weight_init(self.item_embeddings2.weight)
 
+        self.weight_init = weight_init
+        self.apply(self.init_weights)
+
     def init_weights(self, module: nn.Module):
-        if type(module) == nn.Linear:
+        if isinstance(module, nn.Linear):
             self.weight_init(module.weight)
             module.bias.data.fill_(0.1)
 
@@ -112,14 +113,6 @@ class SimpleLinearModel(RecommenderModule):
         self.dropout: nn.Module = dropout_module(dropout_prob)
 
         # output
-        # raise(Exception(2 * n_factors, context_embs * n_factors * window_hist_size, 2,  metadata_size))
-        num_dense = (
-            1 * n_factors
-            + context_embs * n_factors * window_hist_size
-            + 2
-            + metadata_size
-            + filter_size
-        )
         num_dense = (
             continuos_size
             + 1 * n_factors
@@ -144,7 +137,7 @@ class SimpleLinearModel(RecommenderModule):
         weight_init(self.word_embeddings.weight)
 
     def init_weights(self, module: nn.Module):
-        if type(module) == nn.Linear:
+        if isinstance(module, nn.Linear):
             self.weight_init(module.weight)
             module.bias.data.fill_(0.1)
 
@@ -155,11 +148,9 @@ class SimpleLinearModel(RecommenderModule):
         x = F.normalize(x, p=2, dim=1)
         return x
 
-    def item_dot_history(self, itemA, itemB):
-        dot = torch.matmul(
-            self.normalize(itemA.unsqueeze(1)), self.normalize(itemB.permute(0, 2, 1))
-        )
-        return self.flatten(dot)
+    def item_dot_history(self, normalized_item, itemB):
+        # (B, 1, E) * (B, W, E) -> (B, W), same as the batched matmul without the GEMM
+        return (normalized_item * F.normalize(itemB, p=2, dim=2)).sum(dim=2)
 
     def forward(
         self,
@@ -210,48 +201,58 @@ class SimpleLinearModel(RecommenderModule):
         search_for_item_emb = self.item_embeddings(list_search_for_item_idx)
 
         # NLP embs
-        search_for_poi_emb = self.word_embeddings(list_search_for_poi)
-        search_for_destination_emb = self.word_embeddings(list_search_for_destination)
-        change_of_sort_order_emb = self.word_embeddings(list_change_of_sort_order)
-        filter_selection_emb = self.word_embeddings(list_filter_selection)
-
+        # One lookup over the (B, W, 4) stacked word ids; flattening (B, W, 4, E)
+        # gives the same layout as concatenating the four (B, W, E) lookups on dim=2
         context_session_emb = self.flatten(
-            torch.cat(
-                (
-                    search_for_poi_emb,
-                    search_for_destination_emb,
-                    change_of_sort_order_emb,
-                    filter_selection_emb,
-                ),
-                dim=2,
+            self.word_embeddings(
+                torch.stack(
+                    (
+                        list_search_for_poi,
+                        list_search_for_destination,
+                        list_change_of_sort_order,
+                        list_filter_selection,
+                    ),
+                    dim=2,
+                )
             )
         )
 
         # Dot Item X History
-        item_dot_clickout_item_emb = self.item_dot_history(item_emb, clickout_item_emb)
-        item_dot_interaction_item_image_emb = self.item_dot_history(
-            item_emb, interaction_item_image_emb
+        # The item side is the same for every history, so normalize it only once
+        normalized_item_emb = self.normalize(item_emb.unsqueeze(1))
+        item_dot_clickout_item_emb = self.item_dot_history(
+            normalized_item_emb, clickout_item_emb
         )
-        item_dot_interaction_item_info_emb = self.item_dot_history(
-            item_emb, interaction_item_info_emb
+        item_dot_interaction_item_image_emb = self.item_dot_history(
+            normalized_item_emb, interaction_item_image_emb
         )
         item_dot_interaction_item_info_emb = self.item_dot_history(
-            item_emb, interaction_item_info_emb
+            normalized_item_emb, interaction_item_info_emb
         )
         item_dot_interaction_item_rating_emb = self.item_dot_history(
-            item_emb, interaction_item_rating_emb
+            normalized_item_emb, interaction_item_rating_emb
         )
         item_dot_interaction_item_deals_emb = self.item_dot_history(
-            item_emb, interaction_item_deals_emb
+            normalized_item_emb, interaction_item_deals_emb
         )
         item_dot_search_for_item_emb = self.item_dot_history(
-            item_emb, search_for_item_emb
+            normalized_item_emb, search_for_item_emb
         )
 
         # item_dot_user_emb         = self.item_dot_history(item_emb, user_emb)
         # filter_dot_metadata = (self.filter_dense(list_current_filters.float()) * self.metadata_dense(list_metadata.float())).sum(1)
 
         # raise(Exception(item_emb.shape, item_clickout_item_emb.shape,item_clickout_item_emb.unsqueeze(1).shape, self.flatten(item_clickout_item_emb).shape))
+        continuous_features = torch.stack(
+            (
+                is_first_in_impression.float(),
+                pos_item_idx.float(),
+                sum_action_item_before.float(),
+                price.float(),
+            ),
+            dim=1,
+        )
+
         x = torch.cat(
             (
                 item_emb,
@@ -261,10 +262,7 @@ class SimpleLinearModel(RecommenderModule):
                 item_dot_interaction_item_rating_emb,
                 item_dot_interaction_item_deals_emb,
                 item_dot_search_for_item_emb,
-                is_first_in_impression.float().unsqueeze(1),
-                pos_item_idx.float().unsqueeze(1),
-                sum_action_item_before.float().unsqueeze(1),
-                price.float().unsqueeze(1),
+                continuous_features,
                 list_metadata.float(),
                 context_session_emb,
             ),
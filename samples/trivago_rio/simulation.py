@@ -45,10 +45,10 @@ class SimpleLinearModel(RecommenderModule):
         return x
 
     def item_dot_history(self, itemA, itemB):
-        dot = torch.matmul(
-            self.normalize(itemA.unsqueeze(1)), self.normalize(itemB.permute(0, 2, 1))
-        )
-        return self.flatten(dot)
+        # (B, 1, E) * (B, W, E) -> (B, W), same as the batched matmul without the GEMM
+        return (
+            self.normalize(itemA.unsqueeze(1)) * F.normalize(itemB, p=2, dim=2)
+        ).sum(dim=2)
 
     def forward(
         self, user_ids, item_ids, pos_item_id, list_reference_item, list_metadata,
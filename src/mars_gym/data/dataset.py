@@ -1,15 +1,131 @@
-from typing import Tuple, List, Union, Optional, Dict, Any
+from typing import Tuple, List, Union, Optional, Dict, Any, Callable
 
 import functools
+import hashlib
+import logging
+import os
+from collections.abc import Mapping
 import numpy as np
 import pandas as pd
-import random
 from torch.utils.data import Dataset
 
 from mars_gym.meta_config import ProjectConfig, IOType, Column
+from mars_gym.utils.files import get_data_frame_cache_path
 from mars_gym.utils.index_mapping import map_array
 from mars_gym.utils.utils import parallel_literal_eval, reduce_df_mem
 import gc
+
+try:
+    from pyarrow import ArrowException
+except ImportError:  # pandas raises an ImportError on to_parquet/read_parquet without pyarrow
+    ArrowException = ImportError
+
+logger = logging.getLogger(__name__)
+
+# Bump it when the preprocessing changes the cached frames, to stop reading the old ones
+DATA_FRAME_CACHE_VERSION = 1
+DATA_FRAME_CACHE_MAX_BYTES = int(
+    os.environ.get("DATA_FRAME_CACHE_MAX_BYTES", 20 * 1024 ** 3)
+)
+# Unreadable or unwritable files, types Arrow can't convert, or no Parquet engine installed
+PARQUET_ERRORS = (OSError, ImportError, ArrowException)
+
+
+def read_csv(path: str, **kwargs) -> pd.DataFrame:
+    # The pyarrow engine parses with multiple threads, but needs pandas >= 1.4 and pyarrow
+    try:
+        return pd.read_csv(path, engine="pyarrow", **kwargs)
+    except (ImportError, ValueError):
+        return pd.read_csv(path, **kwargs)
+
+
+def read_parquet(path: str, **kwargs) -> pd.DataFrame:
+    data_frame = pd.read_parquet(path, **kwargs)
+    # Parquet list columns come back as arrays, the rest of the code expects lists
+    for name in data_frame.columns:
+        if data_frame[name].dtype != object:
+            continue
+        values = data_frame[name].values
+        valid_positions = np.flatnonzero(pd.notnull(values))
+        if len(valid_positions) > 0 and isinstance(values[valid_positions[0]], np.ndarray):
+            data_frame[name] = [
+                value.tolist() if isinstance(value, np.ndarray) else value for value in values
+            ]
+    return data_frame
+
+
+def _callable_name(function: Callable) -> str:
+    function = getattr(function, "func", function)
+    return "{}.{}".format(
+        getattr(function, "__module__", None), getattr(function, "__qualname__", None)
+    )
+
+
+def _evict_data_frame_cache(cache_dir: str, max_bytes: int) -> None:
+    # Least recently used first, reads refresh the mtime
+    entries = []
+    for name in os.listdir(cache_dir):
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+
+def read_csv_cached(
+    path: str,
+    preprocess: Callable[[pd.DataFrame], pd.DataFrame],
+    project_config: ProjectConfig,
+    usecols: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    # Keeps the preprocessed (literal_eval'd) frame as Parquet, keyed by the file version, the
+    # parsing config and the preprocessing function
+    stat = os.stat(path)
+    key = hashlib.sha1(
+        repr(
+            (
+                DATA_FRAME_CACHE_VERSION,
+                os.path.abspath(path),
+                stat.st_mtime,
+                stat.st_size,
+                usecols,
+                _callable_name(preprocess),
+                [(column.name, str(column.type)) for column in project_config.all_columns],
+                project_config.available_arms_column_name,
+            )
+        ).encode()
+    ).hexdigest()
+    cache_path = get_data_frame_cache_path(key)
+
+    if os.path.exists(cache_path):
+        try:
+            data_frame = read_parquet(cache_path)
+            os.utime(cache_path)
+            return data_frame
+        except PARQUET_ERRORS as e:
+            logger.warning("Could not read the cached %s, parsing %s again: %s", cache_path, path, e)
+
+    data_frame = preprocess(read_csv(path, usecols=usecols))
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        data_frame.to_parquet(cache_path)
+        _evict_data_frame_cache(os.path.dirname(cache_path), DATA_FRAME_CACHE_MAX_BYTES)
+    except PARQUET_ERRORS as e:
+        logger.warning("Could not cache %s as Parquet: %s", path, e)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+    return data_frame
+
+
 def literal_eval_array_columns(data_frame: pd.DataFrame, columns: List[Column]):
     for column in columns:
         if (
@@ -88,20 +204,105 @@ def preprocess_metadata_data_frame(
     return embeddings_for_metadata
 
 
-def _rand_int_except(low: int, high: int, exception: int) -> int:
-    while True:
-        number = np.random.randint(low, high)
-        if number != exception:
-            return number
+def _rand_ints_except(
+    rng: np.random.Generator, low: int, high: int, exceptions: np.ndarray
+) -> np.ndarray:
+    # Rejection sampling for the whole batch at once: only the collisions are drawn again
+    numbers = rng.integers(low, high, size=len(exceptions))
+    collisions = numbers == exceptions
+    while collisions.any():
+        numbers[collisions] = rng.integers(low, high, size=int(collisions.sum()))
+        collisions = numbers == exceptions
+    return numbers
 
 
-def _choose_except(values: list, exception: Any) -> int:
+def _choose_except(rng: np.random.Generator, values: list, exception: Any) -> int:
     while True:
-        value = random.choice(values)
+        value = values[rng.integers(len(values))]
         if value != exception:
             return value
 
 
+def _as_soa(data_frame: pd.DataFrame, columns: List[Column]) -> Dict[str, np.ndarray]:
+    soa: Dict[str, np.ndarray] = {}
+    for column in columns:
+        if column.name not in data_frame.columns:
+            continue
+        values = data_frame[column.name].values
+        if column.type == IOType.INDEXABLE:
+            values = _as_compact_indices(values.astype(np.int64, copy=False))
+        elif column.type == IOType.NUMBER:
+            values = values.astype(np.float64, copy=False)
+        elif column.type == IOType.INDEXABLE_ARRAY:
+            values = _as_compact_indices(_as_dense_array(values, np.int64))
+        elif column.type == IOType.INT_ARRAY:
+            values = _as_dense_array(values, np.int64)
+        elif column.type == IOType.FLOAT_ARRAY:
+            values = _as_dense_array(values, np.float64)
+        soa[column.name] = np.ascontiguousarray(values)
+    return soa
+
+
+def _as_dense_array(values: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    # Fixed-length lists become a single 2D array, so batches are sliced from it instead of
+    # being rebuilt row by row. Ragged lists keep the object array.
+    try:
+        dense = np.array(values.tolist(), dtype=dtype)
+    except (ValueError, TypeError):
+        return values
+    return dense if dense.ndim >= 2 else values
+
+
+def _as_compact_indices(values: np.ndarray) -> np.ndarray:
+    # Indices are kept as int32 at rest, halving the dataset's memory and the bytes gathered
+    # per batch. _convert_dtype widens each batch back to the int64 the embeddings expect.
+    if values.dtype != np.int64:
+        return values
+    int32_info = np.iinfo(np.int32)
+    if values.size == 0 or (values.min() >= int32_info.min and values.max() <= int32_info.max):
+        return values.astype(np.int32)
+    return values
+
+
+class RowView(Mapping):
+    """Read-only dict-like view of one row of a frame kept as per-column arrays.
+
+    Replaces ``data_frame.to_dict("records")``: the rows share the column arrays, and the
+    ``shared`` values (the same for every row) are stored once instead of once per row.
+    """
+
+    __slots__ = ("_columns", "_index", "_shared")
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        index: int,
+        shared: Optional[Dict[str, Any]] = None,
+    ):
+        self._columns = columns
+        self._index = index
+        self._shared = shared or {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._shared:
+            return self._shared[key]
+        return self._columns[key][self._index]
+
+    def __iter__(self):
+        yield from self._columns
+        yield from (key for key in self._shared if key not in self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns) + sum(1 for key in self._shared if key not in self._columns)
+
+    @classmethod
+    def from_data_frame(
+        cls, data_frame: pd.DataFrame, shared: Optional[Dict[str, Any]] = None
+    ) -> List["RowView"]:
+        columns = {column: data_frame[column].values for column in data_frame.columns}
+        return [cls(columns, i, shared) for i in range(len(data_frame))]
+
+
 class InteractionsDataset(Dataset):
     def __init__(
         self,
@@ -110,42 +311,52 @@ class InteractionsDataset(Dataset):
         project_config: ProjectConfig,
         index_mapping: Dict[str, Dict[Any, int]],
         *args,
+        seed: Optional[int] = None,
         **kwargs
     ) -> None:
+        self.seed_sampling(seed)
         self._project_config = project_config
         self._index_mapping  = index_mapping
         self._input_columns: List[Column] = project_config.input_columns
-        input_column_names = [input_column.name for input_column in self._input_columns]
 
         if project_config.item_is_input:
             self._item_input_index = self._input_columns.index(
                 project_config.item_column
             )
 
-        auxiliar_output_column_names = [
-            auxiliar_output_column.name
-            for auxiliar_output_column in project_config.auxiliar_output_columns
-        ]
-        self._data_frame = data_frame[
-            set(
-                input_column_names
-                + [project_config.output_column.name]
-                + auxiliar_output_column_names
-            ).intersection(data_frame.columns)
-        ]
         self._embeddings_for_metadata = embeddings_for_metadata
+        # Only the column arrays are kept, not the frame, so the caller can release it
+        self._len = len(data_frame)
+        self._soa = _as_soa(
+            data_frame,
+            self._input_columns
+            + [project_config.output_column]
+            + project_config.auxiliar_output_columns,
+        )
 
     def __len__(self) -> int:
-        return self._data_frame.shape[0]
+        return self._len
+
+    def row_nbytes(self) -> int:
+        # Average size of the columns of a row, estimated without building (and sampling) an item
+        return sum(values.nbytes for values in self._soa.values()) // max(1, self._len)
+
+    def seed_sampling(self, seed: Optional[int]) -> None:
+        # Used by the datasets that sample negatives. Each DataLoader worker reseeds it (see seed_worker)
+        self._rng = np.random.default_rng(seed)
 
     def _convert_dtype(self, value: np.ndarray, type: IOType) -> np.ndarray:
         if type == IOType.INDEXABLE:
-            return value.astype(np.int64)
+            return value.astype(np.int64, copy=False)
         if type == IOType.NUMBER:
-            return value.astype(np.float64)
+            return value.astype(np.float64, copy=False)
         if type in (IOType.INT_ARRAY, IOType.INDEXABLE_ARRAY):
+            if value.dtype != object:
+                return value.astype(np.int64, copy=False)
             return np.array([np.array(v, dtype=np.int64) for v in value])
         if type == IOType.FLOAT_ARRAY:
+            if value.dtype != object:
+                return value.astype(np.float64, copy=False)
             return np.array([np.array(v, dtype=np.float64) for v in value])
         return value
 
@@ -154,11 +365,10 @@ class InteractionsDataset(Dataset):
     ) -> Tuple[Tuple[np.ndarray, ...], Union[np.ndarray, Tuple[np.ndarray, ...]]]:
         if isinstance(indices, int):
             indices = [indices]
-        rows: pd.Series = self._data_frame.iloc[indices]
 
         inputs = tuple(
-            self._convert_dtype(rows[column.name].values, column.type)
-            for column in self._input_columns if column.name in self._data_frame.columns
+            self._convert_dtype(self._soa[column.name][indices], column.type)
+            for column in self._input_columns if column.name in self._soa
         )
         
         if (
@@ -168,17 +378,17 @@ class InteractionsDataset(Dataset):
             item_indices = inputs[self._item_input_index]
             inputs += tuple(
                 self._embeddings_for_metadata[column.name][item_indices]
-                for column in self._project_config.metadata_columns if column.name not in self._data_frame.columns
+                for column in self._project_config.metadata_columns if column.name not in self._soa
             )
         #from IPython import embed; embed()
         #
         output = self._convert_dtype(
-            rows[self._project_config.output_column.name].values,
+            self._soa[self._project_config.output_column.name][indices],
             self._project_config.output_column.type,
         )
         if self._project_config.auxiliar_output_columns:
             output = tuple([output]) + tuple(
-                self._convert_dtype(rows[column.name].values, column.type)
+                self._convert_dtype(self._soa[column.name][indices], column.type)
                 for column in self._project_config.auxiliar_output_columns
             )
         # print(inputs)
@@ -230,7 +440,7 @@ class InteractionsWithNegativeItemGenerationDataset(InteractionsDataset):
 
         if num_of_negatives > 0:
             sample_positive_indices = list(
-                np.random.randint(0, n, size=num_of_negatives)
+                self._rng.integers(0, n, size=num_of_negatives)
             )
 
             negative_input, _ = super().__getitem__(sample_positive_indices)
@@ -239,11 +449,11 @@ class InteractionsWithNegativeItemGenerationDataset(InteractionsDataset):
             )
 
             negative_input = list(negative_input)
-            negative_input[self._item_input_index] = np.array(
-                [
-                    _rand_int_except(0, self._max_item_idx + 1, exception=item_idx)
-                    for item_idx in negative_input[self._item_input_index]
-                ]
+            negative_input[self._item_input_index] = _rand_ints_except(
+                self._rng,
+                0,
+                self._max_item_idx + 1,
+                exceptions=negative_input[self._item_input_index],
             )
             negative_input = tuple(negative_input)
 
@@ -324,7 +534,7 @@ class InteractionsWithNegativeItemGenerationByAvailableItemsDataset(
             negative_input = list(negative_input)
             negative_input[self._item_input_index] = np.array(
                 [
-                    _choose_except(self._available_items[index], item_idx)
+                    _choose_except(self._rng, self._available_items[index], item_idx)
                     for index, item_idx in zip(negative_indices, negative_input[self._item_input_index])
                 ]
             )
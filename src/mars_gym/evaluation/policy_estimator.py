@@ -1,4 +1,4 @@
-from copy import deepcopy
+from copy import copy
 from typing import List, Type
 
 import luigi
@@ -33,7 +33,7 @@ class PolicyEstimatorTraining(TorchModelTraining):
     @property
     def project_config(self) -> ProjectConfig:
         if not hasattr(self, "_project_config"):
-            project_config = deepcopy(super().project_config)
+            project_config = copy(super().project_config)
             project_config.output_column = project_config.item_column
             project_config.item_is_input = False
             self._project_config = project_config
@@ -16,12 +16,17 @@ from tqdm import tqdm
 import gc
 from mars_gym.data.dataset import (
     preprocess_interactions_data_frame,
+    read_parquet,
     InteractionsDataset,
 )
 from mars_gym.evaluation.propensity_score import FillPropensityScoreMixin
 from mars_gym.evaluation.metrics.fairness import calculate_fairness_metrics
 from mars_gym.utils import files
-from mars_gym.utils.files import get_test_set_predictions_path, get_params_path
+from mars_gym.utils.files import (
+    get_test_set_predictions_path,
+    get_test_set_predictions_parquet_path,
+    get_params_path,
+)
 from mars_gym.evaluation.metrics.offpolicy import (
     eval_IPS,
     eval_CIPS,
@@ -208,14 +213,21 @@ class EvaluateTestSetPredictions(FillPropensityScoreMixin, BaseEvaluationTask):
     def run(self):
         os.makedirs(self.output().path)
 
-        df: pd.DataFrame = pd.read_csv(
-            get_test_set_predictions_path(self.model_training.output().path),
-            dtype = {self.model_training.project_config.item_column.name : "str"}
-        )  # .sample(10000)
-
-        df["sorted_actions"] = parallel_literal_eval(df["sorted_actions"])
-        df["prob_actions"]   = parallel_literal_eval(df["prob_actions"])
-        df["action_scores"]  = parallel_literal_eval(df["action_scores"])
+        # The training leaves only the format it managed to write
+        parquet_path = get_test_set_predictions_parquet_path(self.model_training.output().path)
+        if os.path.exists(parquet_path):
+            df: pd.DataFrame = read_parquet(parquet_path)
+            item_column = self.model_training.project_config.item_column.name
+            df[item_column] = df[item_column].astype(str)
+        else:
+            df: pd.DataFrame = pd.read_csv(
+                get_test_set_predictions_path(self.model_training.output().path),
+                dtype = {self.model_training.project_config.item_column.name : "str"}
+            )  # .sample(10000)
+
+            df["sorted_actions"] = parallel_literal_eval(df["sorted_actions"])
+            df["prob_actions"]   = parallel_literal_eval(df["prob_actions"])
+            df["action_scores"]  = parallel_literal_eval(df["action_scores"])
 
         df["action"] = df["sorted_actions"].apply(
             lambda sorted_actions: str(sorted_actions[0])
@@ -36,18 +36,15 @@ class RecSysEnv(gym.Env, utils.EzPickle):
             assert isinstance(
                 self._dataset[available_items_column].values[0], collections.Sequence
             )
+            arms = self._dataset[available_items_column].tolist()
+            lengths = np.fromiter(map(len, arms), dtype=np.int64, count=len(arms))
             available_items = np.zeros(
                 (len(self._dataset), self._number_of_items), dtype=np.int8
             )
-            non_zero_indices = [
-                (i, available_item)
-                for i, available_items in enumerate(
-                    self._dataset[available_items_column]
-                )
-                for available_item in available_items
-            ]
-            i, j = zip(*non_zero_indices)
-            available_items[i, j] = 1
+            if lengths.sum() > 0:
+                rows = np.repeat(np.arange(len(arms)), lengths)
+                cols = np.concatenate([np.asarray(a, dtype=np.int64) for a in arms])
+                available_items[rows, cols] = 1
             self._dataset[available_items_column] = list(iter(available_items))
 
         self._obs_dataset: List[dict] = self._dataset.drop(
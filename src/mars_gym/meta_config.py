@@ -62,6 +62,7 @@ class ProjectConfig(object):
         metadata_columns: List[Column] = [],
         auxiliar_output_columns: List[Column] = [],
         possible_negative_indices_columns: Dict[str, List[str]] = None,
+        dataset_owns_data: bool = False,
     ) -> None:
         self.base_dir = base_dir
         self.prepare_data_frames_task = prepare_data_frames_task
@@ -85,6 +86,8 @@ class ProjectConfig(object):
         self.default_balance_fields = default_balance_fields
         self.metadata_columns = metadata_columns
         self.possible_negative_indices_columns = possible_negative_indices_columns
+        # The dataset_class copies the columns it needs, so the source data frames can be released
+        self.dataset_owns_data = dataset_owns_data
 
     @property
     def input_columns(self) -> List[Column]:
@@ -57,3 +57,18 @@ class BanditAgent(object):
             arm_scores=arm_scores,
             with_probs=True,
         )
+
+    def rank_batch(
+        self,
+        arms_list: List[List[Any]],
+        arm_indices_list: List[List[int]],
+        arm_contexts_list: List[Tuple[np.ndarray, ...]],
+        arm_scores_list: Optional[List[List[float]]],
+    ) -> Tuple[List[List[Any]], List[List[float]]]:
+        return self.bandit.rank_batch(
+            arms_list=arms_list,
+            arm_indices_list=arm_indices_list,
+            arm_contexts_list=arm_contexts_list,
+            arm_scores_list=arm_scores_list,
+            with_probs=True,
+        )
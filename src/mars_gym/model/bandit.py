@@ -15,6 +15,10 @@ from mars_gym.utils.utils import chunks
 
 
 class BanditPolicy(object, metaclass=abc.ABCMeta):
+    # Set by policies whose _select_idx is a plain argmax over the scores, so rank_batch can
+    # sort them instead. It only applies to the class that defines that _select_idx.
+    _rank_by_argmax: bool = False
+
     def __init__(self, reward_model: nn.Module) -> None:
         self.reward_model = reward_model
         self._limit = None
@@ -119,8 +123,76 @@ class BanditPolicy(object, metaclass=abc.ABCMeta):
         else:
             return ranked_arms
 
+    def rank_batch(
+        self,
+        arms_list: List[List[Any]],
+        arm_indices_list: List[List[int]],
+        arm_contexts_list: List[Tuple[np.ndarray, ...]],
+        arm_scores_list: List[List[float]],
+        with_probs: bool = False,
+    ) -> Union[List[List[Any]], Tuple[List[List[Any]], List[List[float]]]]:
+        if self._ranks_by_argmax() and arm_scores_list is not None:
+            orders = self._argsort_scores(arm_scores_list)
+            ranked_arms_list = [
+                [arms[idx] for idx in order] for arms, order in zip(arms_list, orders)
+            ]
+            if not with_probs:
+                return ranked_arms_list
+            prob_ranked_arms_list = [
+                np.asarray(self._compute_prob(arm_indices, arm_scores))[order].tolist()
+                for arm_indices, arm_scores, order in zip(
+                    arm_indices_list, arm_scores_list, orders
+                )
+            ]
+            return ranked_arms_list, prob_ranked_arms_list
+
+        results = [
+            self.rank(
+                arms,
+                arm_indices,
+                arm_contexts=arm_contexts,
+                arm_scores=arm_scores,
+                with_probs=with_probs,
+            )
+            for arms, arm_indices, arm_contexts, arm_scores in zip(
+                arms_list,
+                arm_indices_list,
+                arm_contexts_list,
+                arm_scores_list
+                if arm_scores_list is not None
+                else [None] * len(arm_indices_list),
+            )
+        ]
+        if with_probs:
+            return [result[0] for result in results], [result[1] for result in results]
+        return results
+
+    def _ranks_by_argmax(self) -> bool:
+        # A subclass that overrides rank or _select_idx falls back to rank() per row
+        if type(self).rank is not BanditPolicy.rank:
+            return False
+        for cls in type(self).__mro__:
+            if "_select_idx" in vars(cls):
+                return vars(cls).get("_rank_by_argmax", False)
+        return False
+
+    def _argsort_scores(self, arm_scores_list: List[List[float]]) -> List[np.ndarray]:
+        # A stable sort of the negated scores keeps the first of the tied arms first,
+        # like the repeated argmax in rank()
+        lengths = {len(arm_scores) for arm_scores in arm_scores_list}
+        if len(lengths) == 1:
+            return list(
+                np.argsort(-np.asarray(arm_scores_list, dtype=np.float64), axis=1, kind="stable")
+            )
+        return [
+            np.argsort(-np.asarray(arm_scores, dtype=np.float64), kind="stable")
+            for arm_scores in arm_scores_list
+        ]
+
 
 class RandomPolicy(BanditPolicy):
+    _rank_by_argmax = True
+
     def __init__(self, reward_model: nn.Module, seed: int = 42) -> None:
         super().__init__(None)
         self._rng = RandomState(seed)
@@ -144,6 +216,8 @@ class RandomPolicy(BanditPolicy):
 
 
 class FixedPolicy(BanditPolicy):
+    _rank_by_argmax = True
+
     def __init__(self, reward_model: nn.Module, arg: int = 1, seed: int = 42) -> None:
         super().__init__(None)
         self._arg = arg
@@ -190,6 +264,8 @@ class FixedPolicy(BanditPolicy):
 
 
 class ModelPolicy(BanditPolicy):
+    _rank_by_argmax = True
+
     def __init__(self, reward_model: nn.Module, seed: int = 42) -> None:
         super().__init__(reward_model)
         self._rng = RandomState(seed)
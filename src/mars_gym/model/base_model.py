@@ -31,20 +31,15 @@ class LogisticRegression(RecommenderModule):
         self.apply(self.init_weights)
 
     def init_weights(self, module: nn.Module):
-        if type(module) == nn.Linear:
+        if isinstance(module, nn.Linear):
             self.weight_init(module.weight)
             module.bias.data.fill_(0.1)
 
-    def none_tensor(self, x):
-        return type(x) == type(None)
-
     def forward(self, user_ids, item_ids, context_representation=None):
-        x: torch.Tensor = context_representation
-
         # Geral embs
         user_emb = self.user_embeddings(user_ids)
         item_emb = self.item_embeddings(item_ids)
 
         x = torch.cat((user_emb, item_emb), dim=1,)
 
-        return torch.sigmoid(self.linear(x))
+        return self.linear(x).sigmoid_()
@@ -8,6 +8,9 @@ from mars_gym.torch.init import lecun_normal_init
 
 
 class PolicyEstimator(RecommenderModule):
+    # Version 2 keeps the hidden layers in a Sequential with the SELUs between the Linears
+    _version = 2
+
     def __init__(
         self,
         project_config: ProjectConfig,
@@ -31,12 +34,13 @@ class PolicyEstimator(RecommenderModule):
         sample_transformed_inputs = self.transform_inputs(sample_batch)
 
         input_dim = sample_transformed_inputs.shape[1]
-        self.layers = nn.ModuleList(
-            [
+        hidden_layers: List[nn.Module] = []
+        for i, layer_size in enumerate(layers):
+            hidden_layers.append(
                 nn.Linear(input_dim if i == 0 else layers[i - 1], layer_size)
-                for i, layer_size in enumerate(layers)
-            ]
-        )
+            )
+            hidden_layers.append(nn.SELU())
+        self.layers = nn.Sequential(*hidden_layers)
         self.output = nn.Linear(
             layers[-1] if len(layers) > 0 else input_dim, self._n_items
         )
@@ -45,12 +49,27 @@ class PolicyEstimator(RecommenderModule):
         self.apply(self.init_weights)
 
     def init_weights(self, module: nn.Module):
-        if type(module) == nn.Linear:
+        if isinstance(module, nn.Linear):
             self.weight_init(module.weight)
             module.bias.data.fill_(0.1)
-        if type(module) == nn.Embedding:
+        if isinstance(module, nn.Embedding):
             self.weight_init(module.weight)
 
+    def _load_from_state_dict(
+        self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys, error_msgs
+    ):
+        # Older checkpoints kept only the Linears in a ModuleList: the i-th one was at layers.{i}
+        if local_metadata.get("version", 1) < 2:
+            layers_prefix = prefix + "layers."
+            old_keys = [key for key in state_dict if key.startswith(layers_prefix)]
+            values = {key: state_dict.pop(key) for key in old_keys}
+            for key, value in values.items():
+                index, name = key[len(layers_prefix):].split(".", 1)
+                state_dict["{}{}.{}".format(layers_prefix, 2 * int(index), name)] = value
+        super()._load_from_state_dict(
+            state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys, error_msgs
+        )
+
     def flatten(self, input: torch.Tensor) -> torch.Tensor:
         return input.view(input.size(0), -1)
 
@@ -79,8 +98,5 @@ class PolicyEstimator(RecommenderModule):
 
     def forward(self, *inputs: torch.Tensor) -> torch.Tensor:
         out = self.transform_inputs(inputs)
-
-        for layer in self.layers:
-            out = torch.selu(layer(out))
-        out = self.output(out)
+        out = self.output(self.layers(out))
         return torch.log_softmax(out, dim=1)
@@ -15,7 +15,7 @@ from tqdm import tqdm
 import time
 import pickle
 import gc
-from mars_gym.data.dataset import preprocess_interactions_data_frame
+from mars_gym.data.dataset import preprocess_interactions_data_frame, read_csv
 from mars_gym.model.agent import BanditAgent
 from mars_gym.model.bandit import BanditPolicy
 from mars_gym.simulation.training import (
@@ -28,10 +28,7 @@ from mars_gym.utils.reflection import load_attr
 
 tqdm.pandas()
 from mars_gym.gym.envs import RecSysEnv
-from mars_gym.utils.files import (
-    get_interaction_dir,
-    get_history_path,
-)
+from mars_gym.utils.files import get_interaction_dir
 from mars_gym.utils.files import (
     get_simulator_datalog_path,
     get_interator_datalog_path,
@@ -44,6 +41,9 @@ from mars_gym.utils.utils import save_trained_data
 
 
 class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
+    # The environment and the agent read _train_data_frame and _val_data_frame after the datasets
+    _releases_data_frames = False
+
     loss_function: str = luigi.ChoiceParameter(
         choices=TORCH_LOSS_FUNCTIONS.keys(), default="crm"
     )
@@ -274,7 +274,7 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
         os.makedirs(os.path.join(self.output().path, "plot_history"), exist_ok=True)
 
         if trial:
-            history_df = pd.read_csv(get_history_path(self.output().path))
+            history_df = self._history_recorder.history_data_frame
             plot_history(history_df).savefig(
                 os.path.join(
                     self.output().path, "plot_history", "history_{}.jpg".format(i)
@@ -318,8 +318,8 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
         if not hasattr(self, "_interactions_data_frame"):
             data = pd.concat(
                 [
-                    pd.read_csv(self.train_data_frame_path),
-                    pd.read_csv(self.val_data_frame_path),
+                    read_csv(self.train_data_frame_path),
+                    read_csv(self.val_data_frame_path),
                 ],
                 ignore_index=True,
             )
@@ -450,6 +450,7 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
         self.start_time = time.time()
 
         self._save_params()
+        self._mmap_embeddings_for_metadata()
         print("DataFrame: env_data_frame, ", self.env_data_frame.shape)
         print("DataFrame: interactions_data_frame, ", self.interactions_data_frame.shape)
 
@@ -480,12 +481,11 @@ class InteractionTraining(SupervisedModelTraining, metaclass=abc.ABCMeta):
                 # TODO
                 if self.project_config.available_arms_column_name in ob:
                     # The Env returns a binary array to be compatible with OpenAI Gym API but the actual items are needed
-                    ob[self.project_config.available_arms_column_name] = [
-                        self.reverse_index_mapping[self.project_config.item_column.name][index]
-                        for index in np.flatnonzero(
-                            ob[self.project_config.available_arms_column_name]
-                        ).tolist()
-                    ]
+                    ob[self.project_config.available_arms_column_name] = self.reverse_index_arrays[
+                        self.project_config.item_column.name
+                    ][
+                        np.flatnonzero(ob[self.project_config.available_arms_column_name])
+                    ].tolist()
 
                 
                 action, prob = self._act(self.agent, ob)
@@ -1,6 +1,8 @@
 import abc
 import functools
 import gc
+import inspect
+import io
 import json
 import logging
 import os
@@ -8,29 +10,28 @@ import pickle
 import random
 import shutil
 from contextlib import redirect_stdout
-from copy import deepcopy
+from copy import copy
 from multiprocessing import Pool
-from typing import Type, Dict, List, Optional, Tuple, Union, Any, cast
+from typing import Type, Dict, List, Optional, Tuple, Union, Any, Callable, cast
 import math
 import luigi
 import numpy as np
 import pandas as pd
+import psutil
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torchbearer
-from torch.nn.init import xavier_normal
+from torch.nn.init import xavier_normal_
 from torch.optim import Adam, RMSprop, SGD
 from torch.optim.adadelta import Adadelta
 from torch.optim.adagrad import Adagrad
 from torch.optim.adamax import Adamax
 from torch.optim.optimizer import Optimizer
 from torch.utils.data import DataLoader
-from torch.utils.data._utils.collate import default_convert
 from torch.utils.data.dataset import Dataset, ChainDataset
 from torchbearer import Trial
 from torchbearer.callbacks import GradientNormClipping
-from torchbearer.callbacks.checkpointers import ModelCheckpoint
 from torchbearer.callbacks.csv_logger import CSVLogger
 from torchbearer.callbacks.early_stopping import EarlyStopping
 from torchbearer.callbacks.tensor_board import TensorBoard
@@ -47,14 +48,28 @@ from mars_gym.data.dataset import (
     preprocess_interactions_data_frame,
     preprocess_metadata_data_frame,
     literal_eval_array_columns,
+    read_csv,
+    read_csv_cached,
     InteractionsDataset,
+    RowView,
+    PARQUET_ERRORS,
 )
 from mars_gym.gym.envs.recsys import ITEM_METADATA_KEY
 from mars_gym.meta_config import Column, IOType, ProjectConfig
 from mars_gym.model.abstract import RecommenderModule
 from mars_gym.model.agent import BanditAgent
 from mars_gym.model.bandit import BanditPolicy
-from mars_gym.torch.data import NoAutoCollationDataLoader, FasterBatchSampler
+from mars_gym.torch.callbacks import Autocast, HistoryRecorder, InMemoryBest
+from mars_gym.torch.data import (
+    NoAutoCollationDataLoader,
+    FasterBatchSampler,
+    SUPPORTS_PERSISTENT_WORKERS,
+    SUPPORTS_LOADER_GENERATOR,
+    seed_worker,
+    load_batch_non_blocking,
+    nbytes,
+    to_tensors,
+)
 from mars_gym.torch.init import lecun_normal_init, he_init
 from mars_gym.torch.loss import (
     ImplicitFeedbackBCELoss,
@@ -72,13 +87,18 @@ from mars_gym.utils.files import (
     get_tensorboard_logdir,
     get_task_dir,
     get_test_set_predictions_path,
+    get_test_set_predictions_parquet_path,
+    get_embeddings_for_metadata_path,
     get_index_mapping_path,
+    get_legacy_index_mapping_path,
 )
 from mars_gym.utils.index_mapping import (
     create_index_mapping,
     create_index_mapping_from_arrays,
     transform_with_indexing,
     map_array,
+    save_index_mapping,
+    load_index_mapping,
 )
 from mars_gym.utils.plot import plot_history
 from mars_gym.utils import files
@@ -87,6 +107,10 @@ from mars_gym.utils.reflection import load_attr
 logging.basicConfig(
     format="%(asctime)s : %(levelname)s : %(message)s", level=logging.INFO
 )
+logger = logging.getLogger(__name__)
+
+# What torch.jit.script raises for code it can't compile, or whose source it can't read
+_SCRIPT_ERRORS = (RuntimeError, OSError, torch.jit.frontend.FrontendError)
 
 TORCH_OPTIMIZERS = dict(
     adam=Adam,
@@ -113,7 +137,7 @@ TORCH_ACTIVATION_FUNCTIONS = dict(
     relu=F.relu, selu=F.selu, tanh=F.tanh, sigmoid=F.sigmoid, linear=F.linear
 )
 TORCH_WEIGHT_INIT = dict(
-    lecun_normal=lecun_normal_init, he=he_init, xavier_normal=xavier_normal
+    lecun_normal=lecun_normal_init, he=he_init, xavier_normal=xavier_normal_
 )
 TORCH_DROPOUT_MODULES = dict(dropout=nn.Dropout, alpha=nn.AlphaDropout)
 
@@ -126,6 +150,10 @@ VAL_DATA = 'val_data'
 TEST_DATA = 'test_data'
 
 class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
+    # Whether the task reads its data frames only to build the datasets, so they can be released
+    # once built when the project_config sets dataset_owns_data
+    _releases_data_frames: bool = False
+
     project: str = luigi.Parameter(
         description="Should be like config.trivago_contextual_bandit",
     )
@@ -156,6 +184,12 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     seed: int = luigi.IntParameter(default=SEED)
     observation: str = luigi.Parameter(default="")
     load_index_mapping_path: str = luigi.Parameter(default=None)
+    cache_data_frames: bool = luigi.BoolParameter(default=False, significant=False)
+    save_test_set_predictions_as_parquet: bool = luigi.BoolParameter(default=False, significant=False)
+    mmap_embeddings_for_metadata: bool = luigi.BoolParameter(default=False, significant=False)
+    # Extra test set columns to save with the predictions. When empty, every column is saved,
+    # which is what the off-policy and fairness metrics of the evaluation need
+    test_set_predictions_columns: List[str] = luigi.ListParameter(default=[], significant=False)
 
     negative_proportion: int = luigi.FloatParameter(0.0)
 
@@ -206,7 +240,8 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     @property
     def project_config(self) -> ProjectConfig:
         if not hasattr(self, "_project_config"):
-            self._project_config = deepcopy(load_attr(self.project, ProjectConfig))
+            # Only attributes are reassigned on the task's config, so a shallow copy is enough
+            self._project_config = copy(load_attr(self.project, ProjectConfig))
             if (
                 self.loss_function == "crm"
                 and self.project_config.propensity_score_column_name
@@ -249,14 +284,12 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     def metadata_data_frame(self) -> Optional[pd.DataFrame]:
         if not hasattr(self, "_metadata_data_frame"):
             self._metadata_data_frame = (
-                pd.read_csv(self.metadata_data_frame_path)
+                self._read_data_frame(
+                    self.metadata_data_frame_path, self._preprocess_metadata_data_frame
+                )
                 if self.metadata_data_frame_path
                 else None
             )
-            if self._metadata_data_frame is not None:
-                literal_eval_array_columns(
-                    self._metadata_data_frame, self.project_config.metadata_columns
-                )
             #
             transform_with_indexing(
                 self._metadata_data_frame, self.index_mapping, self.project_config
@@ -275,6 +308,47 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
             )
         return self._embeddings_for_metadata
 
+    def _mmap_embeddings_for_metadata(self) -> None:
+        # Read-only memory maps are backed by the page cache, so the forked DataLoader
+        # workers share a single copy instead of each one touching its own
+        if not self.mmap_embeddings_for_metadata or self.embeddings_for_metadata is None:
+            return
+        for name, embedding in self.embeddings_for_metadata.items():
+            if embedding.dtype.kind not in "biuf":
+                logger.warning(
+                    "Not memory mapping the %s embeddings, their %s dtype isn't numeric",
+                    name,
+                    embedding.dtype,
+                )
+                continue
+            path = get_embeddings_for_metadata_path(self.output().path, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.save(path, embedding)
+            self._embeddings_for_metadata[name] = np.load(path, mmap_mode="r")
+
+    def _preprocess_metadata_data_frame(self, data_frame: pd.DataFrame) -> pd.DataFrame:
+        literal_eval_array_columns(data_frame, self.project_config.metadata_columns)
+        return data_frame
+
+    def _read_data_frame(
+        self,
+        path: str,
+        preprocess: Callable[[pd.DataFrame], pd.DataFrame],
+        usecols: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        if self.cache_data_frames:
+            return read_csv_cached(path, preprocess, self.project_config, usecols=usecols)
+        return preprocess(read_csv(path, usecols=usecols))
+
+    def _read_interactions_data_frame(self, path: str) -> pd.DataFrame:
+        return self._read_data_frame(
+            path,
+            functools.partial(
+                preprocess_interactions_data_frame, project_config=self.project_config
+            ),
+            usecols=self.dataset_read_columns,
+        )
+
     @property
     def dataset_read_columns(self) -> List[str]:
         except_columns = [self.project_config.propensity_score_column_name, *[c.name for c in self.project_config.metadata_columns]]
@@ -286,9 +360,8 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     def train_data_frame(self) -> pd.DataFrame:
         if not hasattr(self, "_train_data_frame"):
             print("train_data_frame:")
-            self._train_data_frame = preprocess_interactions_data_frame(
-                pd.read_csv(self.train_data_frame_path, 
-                    usecols = self.dataset_read_columns), self.project_config
+            self._train_data_frame = self._read_interactions_data_frame(
+                self.train_data_frame_path
             )
         
             transform_with_indexing(
@@ -301,9 +374,8 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     def val_data_frame(self) -> pd.DataFrame:
         if not hasattr(self, "_val_data_frame"):
             print("val_data_frame:")
-            self._val_data_frame = preprocess_interactions_data_frame(
-                pd.read_csv(self.val_data_frame_path, 
-                    usecols = self.dataset_read_columns), self.project_config
+            self._val_data_frame = self._read_interactions_data_frame(
+                self.val_data_frame_path
             )
 
             transform_with_indexing(
@@ -316,9 +388,8 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
     def test_data_frame(self) -> pd.DataFrame:
         if not hasattr(self, "_test_data_frame"):
             print("test_data_frame:")
-            self._test_data_frame = preprocess_interactions_data_frame(
-                pd.read_csv(self.test_data_frame_path, 
-                    usecols = self.dataset_read_columns), self.project_config
+            self._test_data_frame = self._read_interactions_data_frame(
+                self.test_data_frame_path
             )
 
             transform_with_indexing(
@@ -328,16 +399,18 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
         return self._test_data_frame
 
     def get_data_frame_for_indexing(self) -> pd.DataFrame:
-        return pd.concat([pd.read_csv(self.train_data_frame_path, 
+        return pd.concat([read_csv(self.train_data_frame_path, 
                                 usecols = self.dataset_read_columns), 
-                         pd.read_csv(self.val_data_frame_path, 
+                         read_csv(self.val_data_frame_path, 
                                 usecols = self.dataset_read_columns)]).drop_duplicates()
 
-    def get_data_frame_interactions(self) ->  pd.DataFrame:
-        return pd.concat([pd.read_csv(self.train_data_frame_path, 
-                                usecols = self.dataset_read_columns), 
-                         pd.read_csv(self.val_data_frame_path, 
-                                usecols = self.dataset_read_columns)]).drop_duplicates()
+    def get_data_frame_interactions(self, columns: Optional[List[str]] = None) ->  pd.DataFrame:
+        # Callers that only need a few columns can skip parsing the others
+        usecols = columns or self.dataset_read_columns
+        return pd.concat([read_csv(self.train_data_frame_path, 
+                                usecols = usecols), 
+                         read_csv(self.val_data_frame_path, 
+                                usecols = usecols)]).drop_duplicates()
 
     @property
     def index_mapping_path(self) -> Optional[str]:
@@ -345,18 +418,24 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
             return get_index_mapping_path(self.load_index_mapping_path)
         return get_index_mapping_path(self.output().path)
 
+    @property
+    def legacy_index_mapping_path(self) -> str:
+        if self.load_index_mapping_path:
+            return get_legacy_index_mapping_path(self.load_index_mapping_path)
+        return get_legacy_index_mapping_path(self.output().path)
+
     @property
     def index_mapping(self) -> Dict[str, Dict[Any, int]]:
         if not hasattr(self, "_index_mapping"):
             print("index_mapping...")
             
             self._creating_index_mapping = True
-            df = preprocess_interactions_data_frame(
-                    self.get_data_frame_for_indexing(), self.project_config
-                )
 
             if os.path.exists(self.index_mapping_path):
-                with open(self.index_mapping_path, "rb") as f:
+                self._index_mapping = load_index_mapping(self.index_mapping_path)
+            elif os.path.exists(self.legacy_index_mapping_path):
+                # Tasks trained before the mapping was saved as arrays
+                with open(self.legacy_index_mapping_path, "rb") as f:
                     self._index_mapping = pickle.load(f)
                 #del self._creating_index_mapping
             else:
@@ -365,6 +444,19 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
             keys_in_map = list(self._index_mapping.keys())
             project_all_columns = [c for c in self.project_config.all_columns if c.name not in keys_in_map]
 
+            # Reading and preprocessing the interactions is the expensive part, so it's
+            # skipped when a persisted mapping already covers every indexable column
+            if any(
+                column.type in (IOType.INDEXABLE, IOType.INDEXABLE_ARRAY)
+                and not column.same_index_as
+                for column in project_all_columns
+            ):
+                df = preprocess_interactions_data_frame(
+                    self.get_data_frame_for_indexing(), self.project_config
+                )
+            else:
+                df = None
+
             print("indexing project_all_columns...")
             for column in project_all_columns:
                 if column.type == IOType.INDEXABLE and not column.same_index_as:
@@ -397,21 +489,35 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
             del self._creating_index_mapping
             del df
 
-            with open(get_index_mapping_path(self.output().path), "wb") as f:
-                pickle.dump(self._index_mapping, f)
+            save_index_mapping(get_index_mapping_path(self.output().path), self._index_mapping)
                 
         return self._index_mapping
 
     @property
     def reverse_index_mapping(self) -> Dict[str, Dict[int, Any]]:
-        rev = {
-            key: {value_: key_ for key_, value_ in mapping.items()}
-            for key, mapping in self.index_mapping.items()
-        }
-        # add nothing 0
-        for key, mapping in self.index_mapping.items():
-            rev[key][0] = 0 
-        return rev
+        # The rollouts look it up for every observation, so it's built only once
+        if not hasattr(self, "_reverse_index_mapping"):
+            rev = {
+                key: {value_: key_ for key_, value_ in mapping.items()}
+                for key, mapping in self.index_mapping.items()
+            }
+            # add nothing 0
+            for key, mapping in self.index_mapping.items():
+                rev[key][0] = 0 
+            self._reverse_index_mapping = rev
+        return self._reverse_index_mapping
+
+    @property
+    def reverse_index_arrays(self) -> Dict[str, np.ndarray]:
+        # Same as reverse_index_mapping, but as arrays indexed by the index, to decode many at once
+        if not hasattr(self, "_reverse_index_arrays"):
+            self._reverse_index_arrays = {}
+            for key, rev in self.reverse_index_mapping.items():
+                array = np.empty(max(rev.keys()) + 1, dtype=object)
+                for index, value in rev.items():
+                    array[index] = value
+                self._reverse_index_arrays[key] = array
+        return self._reverse_index_arrays
 
     @property
     def train_dataset(self) -> Dataset:
@@ -422,8 +528,10 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
                 project_config=self.project_config,
                 index_mapping=self.index_mapping,
                 negative_proportion=self.negative_proportion,
-                data_key=TRAIN_DATA
+                data_key=TRAIN_DATA,
+                seed=self.seed,
             )
+            self._release_data_frame("_train_data_frame")
         return self._train_dataset
 
     @property
@@ -435,8 +543,10 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
                 project_config=self.project_config,
                 index_mapping=self.index_mapping,
                 negative_proportion=self.negative_proportion,
-                data_key=VAL_DATA
+                data_key=VAL_DATA,
+                seed=self.seed,
             )
+            self._release_data_frame("_val_data_frame")
         return self._val_dataset
 
     @property
@@ -448,14 +558,30 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
                 project_config=self.project_config,
                 index_mapping=self.index_mapping,
                 negative_proportion=0.0,
-                data_key=TEST_DATA
+                data_key=TEST_DATA,
+                seed=self.seed,
             )
+            self._release_data_frame("_test_data_frame")
         return self._test_dataset
 
+    def _release_data_frame(self, attr: str) -> None:
+        if (
+            self._releases_data_frames
+            and self.project_config.dataset_owns_data
+            and hasattr(self, attr)
+        ):
+            delattr(self, attr)
+            gc.collect()
+
     @property
     def vocab_size(self):
         if not hasattr(self, "_vocab_size"):
-            self._vocab_size = int(self.train_data_frame.iloc[0]["vocab_size"])
+            if hasattr(self, "_train_data_frame"):
+                self._vocab_size = int(self._train_data_frame.iloc[0]["vocab_size"])
+            else:
+                # Only the first row is needed, so don't load the whole train data frame
+                first_row = read_csv(self.train_data_frame_path, usecols=["vocab_size"], nrows=1)
+                self._vocab_size = int(first_row.iloc[0]["vocab_size"])
         return self._vocab_size
 
     @property
@@ -497,6 +623,14 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
         torch.cuda.manual_seed(self.seed)
         torch.backends.cudnn.deterministic = True
         torch.backends.cudnn.benchmark = False
+        self._rng = np.random.default_rng(self.seed)
+
+    @property
+    def rng(self) -> np.random.Generator:
+        # Not every task runs seed_everything() (e.g. the interaction tasks), so create it on demand
+        if not hasattr(self, "_rng"):
+            self._rng = np.random.default_rng(self.seed)
+        return self._rng
 
     def before_run(self):
         self.index_mapping
@@ -509,6 +643,7 @@ class _BaseModelTraining(luigi.Task, metaclass=abc.ABCMeta):
         self._save_params()
 
         try:
+            self._mmap_embeddings_for_metadata()
             self.train()
         except Exception:
             shutil.rmtree(self.output().path)
@@ -547,6 +682,19 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
     monitor_mode: str = luigi.Parameter(default="min")
     generator_workers: int = luigi.IntParameter(default=0)
     pin_memory: bool = luigi.BoolParameter(default=False)
+    prefetch_factor: int = luigi.IntParameter(default=2, significant=False)
+    compile_module: bool = luigi.BoolParameter(default=False, significant=False)
+    compile_mode: str = luigi.Parameter(default="reduce-overhead", significant=False)
+    jit_inference: bool = luigi.BoolParameter(default=False, significant=False)
+    jit_loss_function: bool = luigi.BoolParameter(default=False, significant=False)
+    print_summary: bool = luigi.BoolParameter(default=True, significant=False)
+    disable_csv_logger: bool = luigi.BoolParameter(default=False, significant=False)
+    disable_tensorboard: bool = luigi.BoolParameter(default=False, significant=False)
+    cudnn_benchmark: bool = luigi.BoolParameter(default=False, significant=False)
+    allow_tf32: bool = luigi.BoolParameter(default=False, significant=False)
+    precision: str = luigi.ChoiceParameter(
+        choices=["fp32", "bf16"], default="fp32", significant=False
+    )
     policy_estimator_extra_params: dict = luigi.DictParameter(default={})
     run_evaluate: bool = luigi.BoolParameter(default=False, significant=False)
     run_evaluate_extra_params: str = luigi.Parameter(default=" --only-new-interactions --only-exist-items", significant=False)
@@ -588,27 +736,70 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
             **self.all_recommender_extra_params,
         )
 
+    # Compiling and scripting are opt-in (compile_module, jit_inference, jit_loss_function):
+    # whatever can't be compiled or scripted is logged and kept eager, it never fails the task
+    def _compile_module(self, module: nn.Module) -> nn.Module:
+        # nn.Module.compile() compiles in place (torch >= 2.2), so the state_dict keys
+        # stay the same and the saved weights can still be loaded by get_trained_module.
+        # It's lazy: only an unsupported mode or Python version fails here.
+        if self.compile_module and hasattr(module, "compile"):
+            try:
+                module.compile(mode=self.compile_mode)
+            except RuntimeError as e:
+                logger.warning("Could not compile %s, running eagerly: %s", type(module).__name__, e)
+        return module
+
+    def _script_submodules(self, module: nn.Module) -> nn.Module:
+        # Only the children are scripted: the module itself keeps its Python methods
+        # (e.g. recommendation_score) that the bandit policies rely on
+        for name, child in module.named_children():
+            try:
+                setattr(module, name, torch.jit.script(child))
+            except _SCRIPT_ERRORS as e:
+                logger.warning(
+                    "Could not script %s (%s), keeping it eager: %s", name, type(child).__name__, e
+                )
+        return module
+
+    def _configure_backends(self):
+        # seed_everything() makes cuDNN deterministic, these trade that for speed
+        if self.cudnn_benchmark:
+            torch.backends.cudnn.deterministic = False
+            torch.backends.cudnn.benchmark = True
+        # TF32 matmuls on Ampere+ GPUs, only available from torch 1.7 on
+        if self.allow_tf32 and hasattr(torch.backends.cuda, "matmul"):
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+            if hasattr(torch, "set_float32_matmul_precision"):
+                torch.set_float32_matmul_precision("high")
+
     def train(self):
         if self.device == "cuda":
             torch.cuda.set_device(self.device_id)
-
-        train_loader = self.get_train_generator()
-        val_loader = self.get_val_generator()
-        module = self.create_module()
+        self._configure_backends()
 
         print("train_data_frame:")
         print(self.train_data_frame.describe())
-        
-        summary_path = os.path.join(self.output().path, "summary.txt")
-        with open(summary_path, "w") as summary_file:
-            with redirect_stdout(summary_file):
-                sample_input = self.get_sample_batch()
-                summary(module, sample_input)
-            summary(module, sample_input)
 
         sample_data = self.train_data_frame.sample(100, replace=True)
         sample_data.to_csv(os.path.join(self.output().path, "sample_train.csv"))
+
+        train_loader = self.get_train_generator()
+        val_loader = self.get_val_generator()
+        if hasattr(self, "_trained_module"):
+            # Trained before, the module of this run replaces it
+            del self._trained_module
+        module = self._compile_module(self.create_module())
         
+        if self.print_summary:
+            # Run the summary forward pass once and write its output to both destinations
+            summary_buffer = io.StringIO()
+            with redirect_stdout(summary_buffer):
+                summary(module.to(self.torch_device), self.get_sample_batch(self.torch_device))
+            with open(os.path.join(self.output().path, "summary.txt"), "w") as summary_file:
+                summary_file.write(summary_buffer.getvalue())
+            print(summary_buffer.getvalue(), end="")
+
         trial = self.create_trial(module)
 
         try:
@@ -618,7 +809,12 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
         except KeyboardInterrupt:
             print("Finishing the training at the request of the user...")
 
-        history_df = pd.read_csv(get_history_path(self.output().path))
+        if self._best_checkpoint.best_state_dict is not None:
+            # Restore the best epoch in place, so evaluate() and the agent reuse this module
+            module.load_state_dict(self._best_checkpoint.best_state_dict)
+            self._trained_module = self._prepare_for_inference(module)
+
+        history_df = self._history_recorder.history_data_frame
 
         plot_history(history_df).savefig(
             os.path.join(self.output().path, "history.jpg")
@@ -628,8 +824,8 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
         self.evaluate()
         self.cache_cleanup()
 
-    def get_sample_batch(self):
-        return default_convert(self.train_dataset[0][0])
+    def get_sample_batch(self, device: Optional[torch.device] = None):
+        return to_tensors(self.train_dataset[0][0], device)
 
     def after_fit(self):
         pass
@@ -641,12 +837,14 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
 
         print("================== Evaluate ========================")
         trial = (
-            Trial(
-                module,
-                self._get_optimizer(module),
-                self._get_loss_function(),
-                callbacks=[],
-                metrics=self.metrics,
+            self._with_batch_loader(
+                Trial(
+                    module,
+                    self._get_optimizer(module),
+                    self._get_loss_function(),
+                    callbacks=[],
+                    metrics=self.metrics,
+                )
             )
             .to(self.torch_device)
             .with_generators(val_generator=val_loader)
@@ -668,6 +866,8 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
 
     def create_trial(self, module: nn.Module) -> Trial:
         loss_function = self._get_loss_function()
+        # The fused optimizers need the parameters to already be on the GPU
+        module.to(self.torch_device)
         trial = Trial(
             module,
             self._get_optimizer(module),
@@ -675,54 +875,116 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
             callbacks=self._get_callbacks(),
             metrics=self.metrics,
         ).to(self.torch_device)
+        self._with_batch_loader(trial)
         if hasattr(loss_function, "torchbearer_state"):
             loss_function.torchbearer_state = trial.state
         return trial
 
+    def _with_batch_loader(self, trial: Trial) -> Trial:
+        if self.device == "cuda":
+            trial.with_loader(load_batch_non_blocking)
+        return trial
+
     def _get_loss_function(self):
-        return TORCH_LOSS_FUNCTIONS[self.loss_function](**self.loss_function_params)
+        loss_function = TORCH_LOSS_FUNCTIONS[self.loss_function](**self.loss_function_params)
+        # Losses that read the trial state need to stay as plain Python objects
+        if self.jit_loss_function and not hasattr(loss_function, "torchbearer_state"):
+            try:
+                loss_function = torch.jit.script(loss_function)
+            except _SCRIPT_ERRORS as e:
+                logger.warning(
+                    "Could not script %s, keeping it eager: %s", type(loss_function).__name__, e
+                )
+        return loss_function
 
     def _get_optimizer(self, module) -> Optimizer:
-        return TORCH_OPTIMIZERS[self.optimizer](
-            module.parameters(), lr=self.learning_rate, **self.optimizer_params
-        )
+        optimizer_class = TORCH_OPTIMIZERS[self.optimizer]
+        optimizer_params = dict(lr=self.learning_rate)
+
+        # Prefer the multi-tensor implementations when the torch version has them
+        accepted_params = inspect.signature(optimizer_class.__init__).parameters
+        if (
+            "fused" in accepted_params
+            and self.device == "cuda"
+            and all(param.is_cuda for param in module.parameters())
+        ):
+            optimizer_params["fused"] = True
+        elif "foreach" in accepted_params:
+            optimizer_params["foreach"] = True
+        optimizer_params.update(self.optimizer_params)
+
+        return optimizer_class(module.parameters(), **optimizer_params)
 
     def _get_callbacks(self):
+        self._best_checkpoint = InMemoryBest(
+            get_weights_path(self.output().path),
+            monitor=self.monitor_metric,
+            mode=self.monitor_mode,
+        )
+        # Keeps the history of the latest trial, so it can be plotted without reading it back from disk
+        self._history_recorder = HistoryRecorder()
         callbacks = [
             *self._get_extra_callbacks(),
-            ModelCheckpoint(
-                get_weights_path(self.output().path),
-                save_best_only=True,
-                monitor=self.monitor_metric,
-                mode=self.monitor_mode,
-            ),
+            self._best_checkpoint,
             EarlyStopping(
                 patience=self.early_stopping_patience,
                 min_delta=self.early_stopping_min_delta,
                 monitor=self.monitor_metric,
                 mode=self.monitor_mode,
             ),
-            CSVLogger(get_history_path(self.output().path)),
-            TensorBoard(get_tensorboard_logdir(self.task_id), write_graph=False),
+            self._history_recorder,
         ]
+        # eval_viz reads the training history from history.csv
+        if not self.disable_csv_logger:
+            callbacks.append(CSVLogger(get_history_path(self.output().path)))
+        if not self.disable_tensorboard:
+            callbacks.append(
+                TensorBoard(get_tensorboard_logdir(self.task_id), write_graph=False)
+            )
         if self.gradient_norm_clipping:
             callbacks.append(
                 GradientNormClipping(
                     self.gradient_norm_clipping, self.gradient_norm_clipping_type
                 )
             )
+        if self.precision == "bf16":
+            unsupported_reason = self._bf16_autocast_unsupported_reason()
+            if unsupported_reason is None:
+                callbacks.append(Autocast(self.device, torch.bfloat16))
+            else:
+                # fp16 would need a GradScaler, so it falls back to full precision
+                logger.warning("Not training in bf16, %s. Training in fp32 instead.", unsupported_reason)
         return callbacks
 
+    def _bf16_autocast_unsupported_reason(self) -> Optional[str]:
+        if not hasattr(torch, "autocast"):
+            return "torch {} has no torch.autocast".format(torch.__version__)
+        if self.device == "cuda":
+            if not torch.cuda.is_available():
+                return "CUDA is not available"
+            if not hasattr(torch.cuda, "is_bf16_supported") or not torch.cuda.is_bf16_supported():
+                return "the GPU does not support bf16"
+        return None
+
     def _get_extra_callbacks(self):
         return []
 
     def get_trained_module(self) -> nn.Module:
+        if hasattr(self, "_trained_module"):
+            # Trained in this process with the best weights already loaded (and compiled, if asked)
+            return self._trained_module
         module = self.create_module().to(self.torch_device)
         state_dict = torch.load(
             get_weights_path(self.output().path), map_location=self.torch_device
         )
         module.load_state_dict(state_dict["model"])
+        return self._compile_module(self._prepare_for_inference(module))
+
+    def _prepare_for_inference(self, module: nn.Module) -> nn.Module:
+        module = module.to(self.torch_device)
         module.eval()
+        if self.jit_inference:
+            module = self._script_submodules(module)
         return module
 
     @property
@@ -734,6 +996,50 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
                 self._torch_device = torch.device("cpu")
         return self._torch_device
 
+    def _should_pin(self, dataset: Dataset, pin_memory: bool) -> bool:
+        if not pin_memory or self.device != "cuda" or not torch.cuda.is_available():
+            return False
+        # Page-locked memory can't be swapped out, so the prefetched batches must fit comfortably.
+        # Only this memory budget decides it: the request's extra "workers*prefetch > 8"
+        # cutoff was dropped on purpose, since many small batches can be pinned just fine.
+        if len(dataset) > 0:
+            batch_bytes = self._row_nbytes(dataset) * self.batch_size
+            prefetched_bytes = max(1, self.generator_workers * self.prefetch_factor) * batch_bytes
+            available_bytes = psutil.virtual_memory().available
+            if prefetched_bytes > available_bytes / 4:
+                logger.warning(
+                    "Not pinning memory: the prefetched batches (%d bytes) would take more than "
+                    "1/4 of the available memory (%d bytes)",
+                    prefetched_bytes,
+                    available_bytes,
+                )
+                return False
+        return True
+
+    def _row_nbytes(self, dataset: Dataset) -> int:
+        if hasattr(dataset, "row_nbytes"):
+            return dataset.row_nbytes()
+        # Building an item can advance the dataset's sampling, so it's done once per dataset
+        if not hasattr(self, "_row_nbytes_by_dataset"):
+            self._row_nbytes_by_dataset = {}
+        if id(dataset) not in self._row_nbytes_by_dataset:
+            self._row_nbytes_by_dataset[id(dataset)] = nbytes(dataset[0])
+        return self._row_nbytes_by_dataset[id(dataset)]
+
+    def _get_generator_params(self, dataset: Dataset, pin_memory: bool) -> Dict[str, Any]:
+        params = dict(
+            num_workers=self.generator_workers,
+            pin_memory=self._should_pin(dataset, pin_memory),
+        )
+        if self.generator_workers > 0:
+            params.update(worker_init_fn=seed_worker)
+            if SUPPORTS_PERSISTENT_WORKERS:
+                # Keep the workers alive between epochs instead of forking them again
+                params.update(persistent_workers=True, prefetch_factor=self.prefetch_factor)
+        if SUPPORTS_LOADER_GENERATOR:
+            params.update(generator=torch.Generator().manual_seed(self.seed))
+        return params
+
     def get_train_generator(self) -> DataLoader:
         batch_sampler = FasterBatchSampler(
             self.train_dataset, self.batch_size, shuffle=True
@@ -741,12 +1047,15 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
         return NoAutoCollationDataLoader(
             self.train_dataset,
             batch_sampler=batch_sampler,
-            num_workers=self.generator_workers,
-            pin_memory=self.pin_memory if self.device == "cuda" else False,
+            **self._get_generator_params(self.train_dataset, self.pin_memory),
         )
 
     def get_val_generator(self) -> Optional[DataLoader]:
-        if len(self.val_data_frame) == 0:
+        # Avoid reading the val data frame again if the dataset already released it
+        if hasattr(self, "_val_dataset"):
+            if len(self._val_dataset) == 0:
+                return None
+        elif len(self.val_data_frame) == 0:
             return None
         batch_sampler = FasterBatchSampler(
             self.val_dataset, self.batch_size, shuffle=False
@@ -754,8 +1063,7 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
         return NoAutoCollationDataLoader(
             self.val_dataset,
             batch_sampler=batch_sampler,
-            num_workers=self.generator_workers,
-            pin_memory=self.pin_memory if self.device == "cuda" else False,
+            **self._get_generator_params(self.val_dataset, self.pin_memory),
         )
 
     def get_test_generator(self) -> DataLoader:
@@ -765,12 +1073,13 @@ class TorchModelTraining(_BaseModelTraining, metaclass=abc.ABCMeta):
         return NoAutoCollationDataLoader(
             self.test_dataset,
             batch_sampler=batch_sampler,
-            num_workers=self.generator_workers,
-            pin_memory=True if self.device == "cuda" else False,
+            **self._get_generator_params(self.test_dataset, True),
         )
 
 
 class SupervisedModelTraining(TorchModelTraining):
+    _releases_data_frames = True
+
     bandit_policy_class: str = luigi.Parameter(
         default="mars_gym.model.bandit.ModelPolicy",
         description="Should be like mars_gym.model.bandit.EpsilonGreedy",
@@ -785,14 +1094,17 @@ class SupervisedModelTraining(TorchModelTraining):
         return BanditAgent(bandit)
 
     @property
-    def unique_items(self) -> List[int]:
+    def unique_items(self) -> np.ndarray:
         if not hasattr(self, "_unique_items"):
             # self.index_mapping
             # self._unique_items = self.get_data_frame_for_indexing()[
             #     self.project_config.item_column.name
             # ].unique()
-            self._unique_items = list(self.index_mapping[self.project_config.item_column.name].keys())[1:-1]
-            self._unique_items = [x for x in self._unique_items if str(x) != 'nan']
+            unique_items = list(self.index_mapping[self.project_config.item_column.name].keys())[1:-1]
+            # An object array, so sampling it returns the same Python values as the mapping keys
+            self._unique_items = np.array(
+                [x for x in unique_items if str(x) != 'nan'], dtype=object
+            )
         return self._unique_items
 
     @property
@@ -808,20 +1120,26 @@ class SupervisedModelTraining(TorchModelTraining):
 
         if self.project_config.available_arms_column_name:
             arms = ob[self.project_config.available_arms_column_name]
-            arms = random.sample(arms, len(arms))
+            # Permute the positions, so the arms themselves keep their Python types
+            arms = [arms[i] for i in self.rng.permutation(len(arms))]
         else: # Only Supervised Mode
             #raise("available_arms_column_name not exist")
             if ob[self.project_config.item_column.name] in self.reverse_index_mapping[self.project_config.item_column.name]:
                 ob_item = self.reverse_index_mapping[self.project_config.item_column.name][ob[self.project_config.item_column.name]]
-                arms = random.sample(self.unique_items, min(101, len(self.unique_items)))
+                arms = self._sample_unique_items(101)
                 arms.append(ob_item)
                 arms = list(np.unique(arms))
             else:
-                arms = random.sample(self.unique_items, min(100, len(self.unique_items)))
+                arms = self._sample_unique_items(100)
 
         return arms
 
-    def _get_arm_scores(self, agent: BanditAgent, ob_dataset: Dataset) -> List[float]:
+    def _sample_unique_items(self, n: int) -> List[Any]:
+        unique_items = self.unique_items
+        indices = self.rng.choice(len(unique_items), min(n, len(unique_items)), replace=False)
+        return unique_items[indices].tolist()
+
+    def _get_arm_scores(self, agent: BanditAgent, ob_dataset: Dataset) -> np.ndarray:
         batch_sampler = FasterBatchSampler(ob_dataset, self.batch_size, shuffle=False)
         generator = NoAutoCollationDataLoader(
             ob_dataset,
@@ -833,19 +1151,23 @@ class SupervisedModelTraining(TorchModelTraining):
         model = agent.bandit.reward_model
         model.to(self.torch_device)
         model.eval()
-        scores = []
+        scores: List[torch.Tensor] = []
         
         #from IPython import embed; embed()
-        with torch.no_grad():
+        # inference_mode also skips the version counter bookkeeping, but only exists from torch 1.9
+        inference_context = torch.inference_mode() if hasattr(torch, "inference_mode") else torch.no_grad()
+        with inference_context:
             for i, (x, _) in tqdm(enumerate(generator), total=len(generator), disable=(len(generator) <= 1)):
                 input_params = x if isinstance(x, list) or isinstance(x, tuple) else [x]
-                input_params = [t.to(self.torch_device) if isinstance(t, torch.Tensor) else t for t in input_params]
+                input_params = [t.to(self.torch_device, non_blocking=True) if isinstance(t, torch.Tensor) else t for t in input_params]
 
                 scores_tensor: torch.Tensor  = model.recommendation_score(*input_params)
-                scores_batch: List[float] = scores_tensor.cpu().numpy().reshape(-1).tolist()
-                scores.extend(scores_batch)
+                # Kept on the device, so there's no host sync per batch
+                scores.append(scores_tensor.reshape(-1))
 
-        return scores
+        if not scores:
+            return np.array([], dtype=np.float32)
+        return torch.cat(scores).cpu().numpy()
 
     def plot_scores(self, scores):
         plt.figure()
@@ -864,23 +1186,36 @@ class SupervisedModelTraining(TorchModelTraining):
         plt.close(figure)
 
     def _create_ob_data_frame(self, ob: dict, arm_indices: List[int]) -> pd.DataFrame:
-        data = [
-            {**ob, self.project_config.item_column.name: arm_index}
-            for arm_index in arm_indices
-        ]
-        ob_df = pd.DataFrame(
-            columns=self.obs_columns + [self.project_config.item_column.name], data=data
+        return self._create_obs_data_frame([ob], [arm_indices])
+
+    def _create_obs_data_frame(
+        self, obs: List[Dict[str, Any]], arm_indices_list: List[List[int]]
+    ) -> pd.DataFrame:
+        # One frame for all the observations, with a row per (observation, arm), built
+        # column-wise. Every arm of an observation shares the same observation values
+        # (list values like the history are shared by reference, not copied).
+        lengths = [len(arm_indices) for arm_indices in arm_indices_list]
+        data = {}
+        for column in self.obs_columns:
+            values = np.empty(len(obs), dtype=object)
+            for i, ob in enumerate(obs):
+                values[i] = ob.get(column, np.nan)
+            data[column] = np.repeat(values, lengths)
+        data[self.project_config.item_column.name] = np.concatenate(
+            [np.asarray(arm_indices) for arm_indices in arm_indices_list]
         )
+        # Scalar columns go back to their numeric dtypes, list columns stay as objects
+        obs_df = pd.DataFrame(data, columns=list(data.keys())).infer_objects()
 
-        ob_df = self._fill_hist_columns(ob_df)
+        obs_df = self._fill_hist_columns(obs_df)
 
-        if self.project_config.output_column.name not in ob_df.columns:
-            ob_df[self.project_config.output_column.name] = 1
+        if self.project_config.output_column.name not in obs_df.columns:
+            obs_df[self.project_config.output_column.name] = 1
         for auxiliar_output_column in self.project_config.auxiliar_output_columns:
-            if auxiliar_output_column.name not in ob_df.columns:
-                ob_df[auxiliar_output_column.name] = 0
+            if auxiliar_output_column.name not in obs_df.columns:
+                obs_df[auxiliar_output_column.name] = 0
 
-        return ob_df
+        return obs_df
 
     def _fill_hist_columns(self, ob_df: pd.DataFrame) -> pd.DataFrame:
         if self.project_config.hist_view_column_name not in ob_df:
@@ -919,32 +1254,21 @@ class SupervisedModelTraining(TorchModelTraining):
         # for ob, arm_indices in tqdm(zip(obs, arm_indices_list), total=len(obs)):
         #     ob_dfs.append(self._create_ob_data_frame(ob, arm_indices))
         # print("B")
-        ob_dfs = [
-            self._create_ob_data_frame(ob, arm_indices)
-            for ob, arm_indices in zip(obs, arm_indices_list)
-        ]
-        
-
         obs_dataset = InteractionsDataset(
-            pd.concat(ob_dfs),
+            self._create_obs_data_frame(obs, arm_indices_list),
             obs[0][ITEM_METADATA_KEY],
             self.project_config,
             self.index_mapping,
         )
 
-        arm_contexts_list: List[Tuple[np.ndarray, ...]] = []
-        i = 0
-        for ob_df in ob_dfs:
-            arm_contexts_list.append(obs_dataset[i : i + len(ob_df)][0])
-            i += len(ob_df)
+        lengths = [len(arm_indices) for arm_indices in arm_indices_list]
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        arm_contexts_list = self._split_arm_contexts(obs_dataset, starts, ends)
 
         if agent.bandit.reward_model:
             all_arm_scores = self._get_arm_scores(agent, obs_dataset)
-            arm_scores_list = []
-            i = 0
-            for ob_df in ob_dfs:
-                arm_scores_list.append(all_arm_scores[i : i + len(ob_df)])
-                i += len(ob_df)
+            arm_scores_list = np.split(all_arm_scores, ends[:-1])
         else:
             arm_scores_list = [
                 agent.bandit.calculate_scores(arm_indices, arm_contexts)
@@ -955,6 +1279,23 @@ class SupervisedModelTraining(TorchModelTraining):
         #print("C")
         return arm_contexts_list, arms_list, arm_indices_list, arm_scores_list
 
+    def _split_arm_contexts(
+        self, obs_dataset: Dataset, starts: np.ndarray, ends: np.ndarray
+    ) -> List[Tuple[np.ndarray, ...]]:
+        # Index the dataset once and split each input at the observation boundaries
+        try:
+            all_arm_contexts = obs_dataset[:][0]
+        except ValueError:
+            all_arm_contexts = None
+        if all_arm_contexts is not None and all(
+            context.dtype != object for context in all_arm_contexts
+        ):
+            return list(
+                zip(*(np.split(context, ends[:-1]) for context in all_arm_contexts))
+            )
+        # Array inputs whose length changes between observations can only be stacked per observation
+        return [obs_dataset[start:end][0] for start, end in zip(starts, ends)]
+
     def _act(self, agent: BanditAgent, ob: dict) -> int:
         (
             arm_contexts_list,
@@ -984,15 +1325,14 @@ class SupervisedModelTraining(TorchModelTraining):
         print("Saving test set predictions...")
         
         if self.sample_size_eval and len(self.test_data_frame) > self.sample_size_eval:
-            obs: List[Dict[str, Any]] = self.test_data_frame.sample(self.sample_size_eval, random_state=self.seed).to_dict("records")
+            test_data_frame = self.test_data_frame.sample(self.sample_size_eval, random_state=self.seed)
         else:
-            obs: List[Dict[str, Any]] = self.test_data_frame.to_dict("records")
+            test_data_frame = self.test_data_frame
 
-        for ob in tqdm(obs, total=len(obs)):
-            if self.embeddings_for_metadata is not None:
-                ob[ITEM_METADATA_KEY] = self.embeddings_for_metadata
-            else:
-                ob[ITEM_METADATA_KEY] = None
+        # Row views over the frame's columns instead of a dict per row
+        obs: List[RowView] = RowView.from_data_frame(
+            test_data_frame, shared={ITEM_METADATA_KEY: self.embeddings_for_metadata}
+        )
 
         print("...prepare_for_agent")
         (
@@ -1003,36 +1343,45 @@ class SupervisedModelTraining(TorchModelTraining):
         ) = self._prepare_for_agent(agent, obs)
         print("...")
         
-        sorted_actions_list = []
-        proba_actions_list  = []
+        sorted_actions_list, proba_actions_list = agent.rank_batch(
+            arms_list, arm_indices_list, arm_contexts_list, arm_scores_list
+        )
 
-        for arm_contexts, arms, arm_indices, arm_scores in tqdm(
-            zip(arm_contexts_list, arms_list, arm_indices_list, arm_scores_list),
-            total=len(arm_contexts_list),
-        ):
-            sorted_actions, proba_actions = agent.rank(
-                arms, arm_indices, arm_contexts, arm_scores
-            )
-            sorted_actions_list.append(sorted_actions)
-            proba_actions_list.append(proba_actions)
+        # The contexts are the largest allocation here and nothing below needs them
+        del arms_list, arm_contexts_list, arm_indices_list
+        gc.collect()
 
-        action_scores_list = [
-            list(reversed(sorted(action_scores))) for action_scores in arm_scores_list
-        ]
+        action_scores_list = self._sort_action_scores(arm_scores_list)
 
         del obs
 
         # Create evaluation file
-        df = pd.read_csv(self.test_data_frame_path)
+        df = read_csv(self.test_data_frame_path)
         if self.sample_size_eval and len(self.test_data_frame) > self.sample_size_eval:
             df = df.sample(self.sample_size_eval, random_state=self.seed)
         
-        df["sorted_actions"] = sorted_actions_list
-        df["prob_actions"]   = proba_actions_list
-        df["action_scores"]  = action_scores_list
+        if self.save_test_set_predictions_as_parquet:
+            sorted_actions_list = self._as_fixed_width_rows(sorted_actions_list)
+            proba_actions_list  = self._as_fixed_width_rows(proba_actions_list, np.float32)
+            action_scores_list  = self._as_fixed_width_rows(action_scores_list, np.float32)
+
+        # One object block with the three columns, instead of inserting them one at a time
+        predictions = pd.DataFrame(
+            {
+                "sorted_actions": sorted_actions_list,
+                "prob_actions": proba_actions_list,
+                "action_scores": action_scores_list,
+            },
+            index=df.index,
+        )
+        df = pd.concat(
+            [df.drop(columns=list(predictions.columns), errors="ignore"), predictions], axis=1
+        )
         
         # join with train interaction information
-        df_train = self.get_data_frame_interactions()[[self.project_config.user_column.name, self.project_config.item_column.name]]
+        df_train = self.get_data_frame_interactions(
+            [self.project_config.user_column.name, self.project_config.item_column.name]
+        )
         df_train['trained'] = 1
         df = df.merge(df_train, on = [self.project_config.user_column.name, self.project_config.item_column.name], how='left')
         df['trained'] =  df['trained'].fillna(0)
@@ -1043,10 +1392,70 @@ class SupervisedModelTraining(TorchModelTraining):
         scores = [score for arm_scores in arm_scores_list for score in arm_scores]
         self.plot_scores(scores)
 
+        if self.test_set_predictions_columns:
+            df = df[self._get_test_set_predictions_columns(df)]
+
         self._to_csv_test_set_predictions(df)
 
+    def _get_test_set_predictions_columns(self, df: pd.DataFrame) -> List[str]:
+        # The columns the ranking metrics of the evaluation always read
+        columns = [
+            self.project_config.user_column.name,
+            self.project_config.item_column.name,
+            self.project_config.output_column.name,
+            "sorted_actions",
+            "prob_actions",
+            "action_scores",
+            "trained",
+            "item_indexed",
+        ]
+        columns += [column for column in self.test_set_predictions_columns if column not in columns]
+        return [column for column in columns if column in df.columns]
+
+    def _as_fixed_width_rows(
+        self, values_list: List[List[Any]], dtype: Optional[np.dtype] = None
+    ) -> Union[List[List[Any]], List[np.ndarray]]:
+        # With the same number of numeric values per row, the rows become views of one 2D array
+        # instead of lists of boxed Python numbers. Other rows are kept as they are.
+        if len({len(values) for values in values_list}) != 1:
+            return values_list
+        array = np.asarray(values_list, dtype=dtype)
+        if array.ndim != 2 or array.dtype.kind not in "iuf":
+            return values_list
+        return list(array)
+
+    def _sort_action_scores(self, arm_scores_list: List[np.ndarray]) -> List[List[float]]:
+        lengths = {len(arm_scores) for arm_scores in arm_scores_list}
+        if len(lengths) == 1:
+            # Same number of arms per observation: one sort over the stacked scores
+            return np.sort(np.asarray(arm_scores_list), axis=1)[:, ::-1].tolist()
+        return [np.sort(arm_scores)[::-1].tolist() for arm_scores in arm_scores_list]
+
     def _to_csv_test_set_predictions(self, df: pd.DataFrame) -> None:
-        df.to_csv(get_test_set_predictions_path(self.output().path), index=False)
+        # Only one of the two files is left, so the evaluation reads the format written last
+        parquet_path = get_test_set_predictions_parquet_path(self.output().path)
+        csv_path = get_test_set_predictions_path(self.output().path)
+        if self.save_test_set_predictions_as_parquet:
+            # The list columns are kept as Parquet lists instead of being stringified
+            try:
+                df.to_parquet(parquet_path, index=False)
+                if os.path.exists(csv_path):
+                    os.remove(csv_path)
+                return
+            except PARQUET_ERRORS as e:
+                logger.warning(
+                    "Could not save the test set predictions as Parquet, saving them as CSV: %s", e
+                )
+                # The CSV is read back with literal_eval, so the array rows go back to lists
+                for column in ["sorted_actions", "prob_actions", "action_scores"]:
+                    if column in df.columns:
+                        df[column] = [
+                            values.tolist() if isinstance(values, np.ndarray) else values
+                            for values in df[column].values
+                        ]
+        if os.path.exists(parquet_path):
+            os.remove(parquet_path)
+        df.to_csv(csv_path, index=False)
 
     def after_fit(self):
         if self.test_size > 0:
@@ -64,6 +64,13 @@ MISTREATMENT_METRICS = [
     "total_individuals",
 ]
 
+def fragment(func):
+    # A fragment only reruns itself when its own widgets change. Streamlit < 1.33 has no
+    # fragments, there the whole script reruns as before
+    st_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    return st_fragment(func) if st_fragment else func
+
+
 # @st.cache
 def fetch_training_path():
     paths = []
@@ -198,14 +205,14 @@ def load_data_iteractions_metrics(model, sample_size=10000):
 
 # @st.cache(allow_output_mutation=True)
 def load_data_orders_metrics(model):
-    return pd.read_csv(
+    return read_csv(
         os.path.join(fetch_results_path()[model], "orders_with_metrics.csv")
     )
 
 
 # @st.cache(allow_output_mutation=True)
 def load_history_train(model):
-    return pd.read_csv(
+    return read_csv(
         os.path.join(fetch_training_path()[model], "history.csv")
     ).set_index("epoch")
 
@@ -371,15 +378,9 @@ def display_iteraction_result():
         st.dataframe(df.head())
 
         st.markdown("## Models")
-        input_explorate = {}
         for group, rows in df.groupby("iteraction", sort=False):
             st.markdown("### " + group)
-            input_explorate[group] = st.checkbox(
-                "Show Explorate Viz", key="input_explorate_" + group
-            )
-
-            if input_explorate[group]:
-                plot_exploration_arm(df[df.iteraction == group], title=group)
+            display_exploration_arm(rows, group)
 
             st.markdown("### Params")
             st.dataframe(params[params.iteraction == group].transpose())
@@ -388,6 +389,12 @@ def display_iteraction_result():
     # st.dataframe(load_iteractions_params(input_iteraction).transpose())
 
 
+@fragment
+def display_exploration_arm(df, group):
+    if st.checkbox("Show Explorate Viz", key="input_explorate_" + group):
+        plot_exploration_arm(df, title=group)
+
+
 def display_fairness_metrics():
     st.title("[Fairness Results]")
 
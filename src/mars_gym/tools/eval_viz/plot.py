@@ -1,3 +1,4 @@
+import functools
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -10,10 +11,20 @@ import plotly.express as px
 from mars_gym.tools.eval_viz.util import mean_confidence_interval
 
 TEMPLATE = "plotly_white"  # simple_white
+# Line traces are downsampled to about this many points before being sent to the browser
+MAX_POINTS_PER_TRACE = 1000
+# Colour of the arms missing from the item list, outside the qualitative palette
+UNKNOWN_ARM_COLOR = "#BBBBBB"
 # https://seaborn.pydata.org/generated/seaborn.color_palette.html#seaborn.color_palette
 # https://plot.ly/python/v3/ipython-notebooks/color-scales/#diverging
 # sns.color_palette("colorblind", n_colors=15).as_hex()
 def get_colors(models, color=px.colors.qualitative.Plotly):
+    # Streamlit reruns the whole script on every interaction, the models rarely change
+    return _get_colors(tuple(models), tuple(color))
+
+
+@functools.lru_cache(maxsize=128)
+def _get_colors(models, color):
     line_dict = {}
     # dash = ['dash', 'dot',  'dashdot']
     for i, model in enumerate(models):
@@ -21,15 +32,76 @@ def get_colors(models, color=px.colors.qualitative.Plotly):
     return line_dict
 
 
+def _downsample_indices(n, n_out=MAX_POINTS_PER_TRACE, values=None):
+    # Keeps the first and the last point, and the minimum and the maximum of every bucket of
+    # the values, so peaks and dips survive. values can hold several traces, one per row, and
+    # gets the union of their extremes, so stacked traces stay aligned
+    if n <= n_out:
+        return np.arange(n)
+    if values is None:
+        return np.unique(np.linspace(0, n - 1, n_out).round().astype(int))
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    # NaNs are never picked as an extreme
+    lows = np.where(np.isnan(values), np.inf, values)
+    highs = np.where(np.isnan(values), -np.inf, values)
+    n_buckets = max(1, (n_out - 2) // (2 * len(values)))
+    edges = np.linspace(1, n - 1, n_buckets + 1).round().astype(int)
+    indices = [np.array([0, n - 1])]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            indices.append(start + lows[:, start:end].argmin(axis=1))
+            indices.append(start + highs[:, start:end].argmax(axis=1))
+    return np.unique(np.concatenate(indices))
+
+
+def _trailing_sums(values, window=None, groups=None):
+    # Sum of the non-NaN values, number of NaNs and number of rows of the trailing window of
+    # every row (all the rows up to it when window is None) within its group, from the
+    # differences of single cumulative sums
+    values = np.asarray(values, dtype=np.float64)
+    groups = np.zeros(len(values), dtype=np.int64) if groups is None else np.asarray(groups)
+    # Sorting by group makes each group contiguous, so no window crosses into another one
+    order = np.argsort(groups, kind="stable")
+    sorted_groups = groups[order]
+    nans = np.isnan(values[order])
+    value_cumsum = np.concatenate(([0.0], np.cumsum(np.where(nans, 0.0, values[order]))))
+    nan_cumsum = np.concatenate(([0], np.cumsum(nans)))
+    ends = np.arange(1, len(values) + 1)
+    starts = np.searchsorted(sorted_groups, sorted_groups)
+    if window is not None:
+        starts = np.maximum(ends - window, starts)
+    sums, nan_counts, lengths = (np.empty(len(values)) for _ in range(3))
+    sums[order] = value_cumsum[ends] - value_cumsum[starts]
+    nan_counts[order] = nan_cumsum[ends] - nan_cumsum[starts]
+    lengths[order] = ends - starts
+    return sums, nan_counts, lengths
+
+
+def _cumsum(values, groups=None):
+    # np.cumsum within each group, so a NaN turns the rest of its group into NaN
+    sums, nan_counts, _ = _trailing_sums(values, groups=groups)
+    sums[nan_counts > 0] = np.nan
+    return sums
+
+
+def _rolling_mean(values, window, groups=None):
+    # Trailing mean with min_periods=1, like Series.rolling(window, min_periods=1).mean()
+    # within each group: NaNs are skipped, and a window of only NaNs is NaN
+    sums, nan_counts, lengths = _trailing_sums(values, window, groups)
+    counts = lengths - nan_counts
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
 def plot_bar(df, confidence=None, title=""):
     data = []
-    for i, row in df.iterrows():
+    for name, values in zip(df.index, df.values):
         data.append(
             go.Bar(
-                name=row.name,
-                x=row.keys(),
-                y=row.values,
-                error_y=dict(type="data", array=[] if confidence is None else confidence.loc[row.name].values),
+                name=name,
+                x=df.columns,
+                y=values,
+                error_y=dict(type="data", array=[] if confidence is None else confidence.loc[name].values),
             )
         )
 
@@ -51,10 +123,11 @@ def plot_line(df, confidence=None, title="", yrange=[0, 1], cum=False):
     data = []
     ymax = yrange[1] if yrange else 1
 
-    for i, row in df.iterrows():
-        values = np.cumsum(row.values) if cum else row.values
+    for name, values in zip(df.index, df.values):
+        values = np.cumsum(values) if cum else values
         ymax = np.max([np.max(values), ymax])
-        data.append(go.Scatter(name=row.name, x=row.keys(), y=values))
+        idx = _downsample_indices(len(values), values=values)
+        data.append(go.Scattergl(name=name, x=df.columns[idx], y=values[idx]))
 
     fig = go.Figure(data=data)
     # Change the bar mode
@@ -72,10 +145,10 @@ def plot_line(df, confidence=None, title="", yrange=[0, 1], cum=False):
 
 def plot_radar(df, confidence=None, title=""):
     data = []
-    for i, row in df.iterrows():
+    for name, values in zip(df.index, df.values):
         data.append(
             go.Scatterpolar(
-                r=row.values, theta=row.keys(), fill="toself", name=row.name
+                r=values, theta=df.columns, fill="toself", name=name
             )
         )
 
@@ -104,26 +177,36 @@ def plot_line_iteraction(
     line_dict={},
 ):
     data = []
+    values_list = []
     ymax = yrange[1] if yrange else 1
 
-    for group, rows in df.groupby("iteraction", sort=False):
-        _x = [i + 1 for i in range(len(rows))]
-        x = sorted(rows["idx"].values)
+    # The transforms run over the whole frame at once, within each iteraction
+    groups = df.groupby("iteraction", sort=False)
+    codes = groups.ngroup().values
+
+    values = df[metric].values
+    if cum:
+        values = _cumsum(values, codes)
 
-        values = rows[metric].values
-        if cum:
-            values = np.cumsum(values)
+    if mean:
+        values = _cumsum(values, codes) / (groups.cumcount().values + 1)
 
-        if mean:
-            values = np.cumsum(values) / _x
+    if roll:
+        values = _rolling_mean(df[metric].values, window, codes)
 
-        if roll:
-            values = rows[metric].rolling(window=window, min_periods=1).mean()
+    df = df.assign(_values=values)
+
+    for group, rows in df.groupby("iteraction", sort=False):
+        x = np.sort(rows["idx"].values)
+        values = rows["_values"].values
 
         x = x[10:-1]
         values = values[10:-1]
+        values_list.append(np.asarray(values))
 
-        ymax = np.max([np.max(values), ymax])
+        idx = _downsample_indices(len(x), values=values)
+        x = x[idx]
+        values = np.asarray(values)[idx]
 
         try:
             first_len = rows.iloc[0][legend[0]]  # .astype(str)
@@ -138,7 +221,7 @@ def plot_line_iteraction(
             name = group
 
         data.append(
-            go.Scatter(
+            go.Scattergl(
                 name=name,
                 x=x,
                 y=values,
@@ -146,6 +229,10 @@ def plot_line_iteraction(
             )
         )
 
+    all_values = np.concatenate(values_list) if values_list else np.array([])
+    if all_values.size > 0:
+        ymax = np.max([np.max(all_values), ymax])
+
     fig = go.Figure(data=data)
     # Change the bar mode
     fig.update_layout(
@@ -167,43 +254,42 @@ def plot_line_iteraction(
 
 def plot_exploration_arm(df, title="", window=20, roll=False, all_items=[]):
     rounds = len(df)
-    arms = np.unique(df["item"].values)
-    arms_rewards = df["item"].values
+    arms, arms_rewards_idx = np.unique(df["item"].values, return_inverse=True)
 
-    arms_idx = {}
+    # Position of each arm in all_items, which picks its colour
     if len(all_items) == 0:
-        all_items = arms
-    for i, a in enumerate(all_items):
-        arms_idx[a] = i
-
-    count_per_arms = {}
-
-    for a in arms:
-        count_per_arms[a] = np.zeros(rounds)
+        arms_idx = np.arange(len(arms))
+    else:
+        arms_idx = pd.Categorical(arms, categories=all_items).codes
 
-    for r in range(rounds):
-        count_per_arms[arms_rewards[r]][r] = 1
+    # One column per arm, with a 1 in the rounds where the arm was chosen
+    count_per_arms = np.zeros((rounds, len(arms)), dtype=np.float32)
+    count_per_arms[np.arange(rounds), arms_rewards_idx] = 1
 
     fig = go.Figure()
-    x = sorted(df["idx"].values)
-
-    for arm, values in count_per_arms.items():
+    if roll:
+        ys = np.array([_rolling_mean(values, window) for values in count_per_arms.T])
+    else:
+        ys = np.cumsum(count_per_arms, axis=0).T
+    idx = _downsample_indices(rounds, values=ys)
+    x = np.sort(df["idx"].values)[idx]
 
-        if roll:
-            y = pd.Series(values).rolling(window=window, min_periods=1).mean()
-        else:
-            y = np.cumsum(values)
+    for arm, arm_idx, y in zip(arms, arms_idx, ys):
+        y = y[idx]
 
+        # pd.Categorical codes arms that aren't in all_items as -1
         fig.add_trace(
             go.Scatter(
-                name="Arm " + str(arm),
+                name="Arm " + str(arm) + (" (unknown)" if arm_idx < 0 else ""),
                 x=x,
                 y=y,
                 hoverinfo="x+y",
                 mode="lines",
                 line=dict(
                     width=0.5,
-                    color=px.colors.qualitative.Plotly[int(arms_idx[arm] % 10)],
+                    color=UNKNOWN_ARM_COLOR
+                    if arm_idx < 0
+                    else px.colors.qualitative.Plotly[int(arm_idx % 10)],
                 ),
                 stackgroup="one",
                 groupnorm="percent",  # define stack group
@@ -257,7 +343,8 @@ def plot_box(df, title=""):
 def plot_history(df, title=""):
     data = []
     for c in df.columns:
-        data.append(go.Scatter(name=c, y=df[c]))
+        idx = _downsample_indices(len(df), values=df[c].values)
+        data.append(go.Scattergl(name=c, x=idx, y=df[c].values[idx]))
 
     fig = go.Figure(data=data)
     # Change the bar mode
@@ -268,14 +355,15 @@ def plot_history(df, title=""):
 
 def plot_metrics(df, title=""):
     data = []
+    marker_color = [_color_by_metric(m) for m in df.columns]
 
-    for i, row in df.iterrows():
+    for name, values in zip(df.index, df.values):
         data.append(
             go.Bar(
-                name=row.name,
-                x=row.keys(),
-                y=row.values,
-                marker_color=[_color_by_metric(m) for m in row.keys()],
+                name=name,
+                x=df.columns,
+                y=values,
+                marker_color=marker_color,
             )
         )
     fig = go.Figure(data=data)
@@ -494,6 +582,7 @@ def confidence(x):
     return mean_confidence_interval(x)[1]
 
 
+@functools.lru_cache(maxsize=None)
 def _color_by_metric(metric):
     if "ndcg" in metric:
         return "#DD8452"
@@ -1,3 +1,4 @@
+import functools
 import pandas as pd
 import json
 import os
@@ -6,12 +7,23 @@ import numpy as np
 import scipy
 
 
+def read_csv(path, **kwargs):
+    # Streamlit reruns the script on every interaction, but this module stays imported, so
+    # the parsed files are kept until they change on disk. Callers get their own copy.
+    return _read_csv(path, os.path.getmtime(path), tuple(sorted(kwargs.items()))).copy()
+
+
+@functools.lru_cache(maxsize=32)
+def _read_csv(path, mtime, kwargs):
+    return pd.read_csv(path, **dict(kwargs))
+
+
 def csv2df(paths, file, idx):
     data = []
     for model, path in paths.items():
         file_path = os.path.join(path, file)
         try:
-            d = pd.read_csv(file_path)
+            d = read_csv(file_path)
             d["path"] = path.split("/")[-1]
             d["model"] = path.split("/")[-1].replace(
                 "_" + path.split("/")[-1].split("_")[-1], ""
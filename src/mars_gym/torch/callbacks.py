@@ -0,0 +1,104 @@
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import torch
+import torchbearer
+from torchbearer.callbacks import Callback
+from torchbearer.callbacks.checkpointers import Best
+
+
+def _to_float(y_pred):
+    if isinstance(y_pred, (list, tuple)):
+        return type(y_pred)(_to_float(y) for y in y_pred)
+    if torch.is_tensor(y_pred) and y_pred.dtype.is_floating_point:
+        return y_pred.float()
+    return y_pred
+
+
+class Autocast(Callback):
+    """Runs the forward pass of every training and validation step under torch.autocast.
+    The loss is computed outside of it, on float32 predictions, since some criterions
+    (e.g. BCELoss) refuse to run under autocast."""
+
+    def __init__(self, device_type: str, dtype: torch.dtype) -> None:
+        super().__init__()
+        self._device_type = device_type
+        self._dtype = dtype
+        self._autocast = None
+
+    def _enter(self):
+        self._autocast = torch.autocast(device_type=self._device_type, dtype=self._dtype)
+        self._autocast.__enter__()
+
+    def _exit(self, state):
+        if self._autocast is not None:
+            self._autocast.__exit__(None, None, None)
+            self._autocast = None
+        state[torchbearer.Y_PRED] = _to_float(state[torchbearer.Y_PRED])
+
+    def on_sample(self, state):
+        self._enter()
+
+    def on_forward(self, state):
+        self._exit(state)
+
+    def on_sample_validation(self, state):
+        self._enter()
+
+    def on_forward_validation(self, state):
+        self._exit(state)
+
+
+class HistoryRecorder(Callback):
+    """Keeps the metrics of every epoch in memory, with the same columns CSVLogger writes."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.history: List[Dict[str, Any]] = []
+
+    def on_end_epoch(self, state):
+        metrics = {
+            key: value.item() if torch.is_tensor(value) else value
+            for key, value in state[torchbearer.METRICS].items()
+        }
+        self.history.append({"epoch": state[torchbearer.EPOCH], **metrics})
+
+    @property
+    def history_data_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.history)
+
+
+class InMemoryBest(Best):
+    """Same as ModelCheckpoint(save_best_only=True), but also keeps a copy of the best model
+    weights, so the trained module can be restored without reading the file back. The copy
+    stays on the model's device while that has room for it, and is updated in place."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.best_state_dict: Optional[Dict[str, torch.Tensor]] = None
+
+    def save_checkpoint(self, model_state, overwrite_most_recent=False):
+        super().save_checkpoint(model_state, overwrite_most_recent)
+        state_dict = model_state[torchbearer.MODEL].state_dict()
+        if self.best_state_dict is None or self.best_state_dict.keys() != state_dict.keys():
+            self.best_state_dict = _allocate_copy(state_dict)
+        for key, value in state_dict.items():
+            self.best_state_dict[key].copy_(value.detach())
+
+
+def _allocate_copy(state_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+    # A device to device copy at every improving epoch is much cheaper than one to the host
+    cuda_values = [value for value in state_dict.values() if value.is_cuda]
+    cuda_bytes = sum(value.numel() * value.element_size() for value in cuda_values)
+    # Twice the size of the copy free, to leave the training some headroom
+    keep_on_device = not cuda_values or (
+        hasattr(torch.cuda, "mem_get_info")
+        and all(
+            torch.cuda.mem_get_info(device)[0] > 2 * cuda_bytes
+            for device in {value.device for value in cuda_values}
+        )
+    )
+    return {
+        key: torch.empty_like(value) if keep_on_device else torch.empty_like(value, device="cpu")
+        for key, value in state_dict.items()
+    }
@@ -1,7 +1,32 @@
-from typing import List
+import inspect
+import random
+from typing import List, Optional
 
+import numpy as np
 import torch
-from torch.utils.data import DataLoader, Sampler, Dataset
+import torchbearer
+from torch.utils.data import DataLoader, Sampler, Dataset, get_worker_info
+
+# persistent_workers and prefetch_factor were only added to the DataLoader in torch 1.7
+SUPPORTS_PERSISTENT_WORKERS = (
+    "persistent_workers" in inspect.signature(DataLoader.__init__).parameters
+)
+# The generator argument, which seeds the base seed of the workers, came in torch 1.6
+SUPPORTS_LOADER_GENERATOR = (
+    "generator" in inspect.signature(DataLoader.__init__).parameters
+)
+
+
+def seed_worker(worker_id: int) -> None:
+    # Forked workers inherit the same numpy/random state. torch already gives every worker
+    # its own seed, base_seed + worker_id, with the base seed drawn again for each epoch
+    # from the loader's generator, so the other generators are seeded from it.
+    worker_seed = torch.initial_seed() % 2 ** 32
+    np.random.seed(worker_seed)
+    random.seed(worker_seed)
+    dataset = get_worker_info().dataset
+    if hasattr(dataset, "seed_sampling"):
+        dataset.seed_sampling(worker_seed)
 
 
 class FasterBatchSampler(Sampler):
@@ -49,3 +74,54 @@ class NoAutoCollationDataLoader(DataLoader):
     @property
     def _index_sampler(self):
         return self.batch_sampler
+
+
+def non_blocking_deep_to(batch, device: torch.device, dtype: torch.dtype):
+    if isinstance(batch, (list, tuple)):
+        return type(batch)(non_blocking_deep_to(b, device, dtype) for b in batch)
+    if isinstance(batch, dict):
+        return {key: non_blocking_deep_to(value, device, dtype) for key, value in batch.items()}
+    if torch.is_tensor(batch):
+        if batch.dtype.is_floating_point:
+            return batch.to(device, dtype, non_blocking=True)
+        return batch.to(device, non_blocking=True)
+    return batch
+
+
+def to_tensors(obj, device: Optional[torch.device] = None):
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_tensors(o, device) for o in obj)
+    if isinstance(obj, dict):
+        return {key: to_tensors(value, device) for key, value in obj.items()}
+    if isinstance(obj, np.ndarray) and obj.dtype.kind in "biuf":
+        return torch.as_tensor(obj, device=device)
+    return obj
+
+
+def nbytes(obj) -> int:
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(o) for o in obj)
+    if isinstance(obj, dict):
+        return sum(nbytes(value) for value in obj.values())
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if torch.is_tensor(obj):
+        return obj.element_size() * obj.nelement()
+    return 0
+
+
+def load_batch_non_blocking(state: dict):
+    """Same as torchbearer's load_batch_predict, but copying the batch with non_blocking=True,
+    so the copy from pinned memory overlaps with the computation of the previous step."""
+    data = non_blocking_deep_to(
+        next(state[torchbearer.ITERATOR]),
+        state[torchbearer.DEVICE],
+        state[torchbearer.DATA_TYPE],
+    )
+    if isinstance(data, (list, tuple)):
+        try:
+            state[torchbearer.X], state[torchbearer.Y_TRUE] = data
+        except ValueError:
+            state[torchbearer.X] = data[0]
+    else:
+        state[torchbearer.X] = data
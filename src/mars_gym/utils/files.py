@@ -53,5 +53,21 @@ def get_test_set_predictions_path(task_dir: str) -> str:
     return os.path.join(task_dir, "test_set_predictions.csv")
 
 
+def get_test_set_predictions_parquet_path(task_dir: str) -> str:
+    return os.path.join(task_dir, "test_set_predictions.parquet")
+
+
+def get_embeddings_for_metadata_path(task_dir: str, name: str) -> str:
+    return os.path.join(task_dir, "embeddings_for_metadata", "{}.npy".format(name))
+
+
+def get_data_frame_cache_path(key: str) -> str:
+    return os.path.join(OUTPUT_PATH, "data_frame_cache", "{}.parquet".format(key))
+
+
 def get_index_mapping_path(task_dir: str) -> str:
+    return os.path.join(task_dir, "index_mapping.npz")
+
+
+def get_legacy_index_mapping_path(task_dir: str) -> str:
     return os.path.join(task_dir, "index_mapping.pkl")
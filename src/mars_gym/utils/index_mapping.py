@@ -1,6 +1,8 @@
 import functools
+import itertools
 from collections import defaultdict
-from typing import Dict, Any, List, Iterable
+from collections.abc import MutableMapping
+from typing import Dict, Any, List, Iterable, Iterator
 
 import numpy as np
 import pandas as pd
@@ -12,9 +14,14 @@ import os
 def create_index_mapping(
     indexable_values: Iterable, include_unkown: bool = True, include_none: bool = True
 ) -> Dict[Any, int]:
-    indexable_values = list(
-        sorted(set(str(value) for value in indexable_values if not pd.isnull(value)))
+    # Deduplicate in C before the Python-level sort, which then only sees the unique values
+    values = pd.Series(
+        indexable_values
+        if isinstance(indexable_values, np.ndarray)
+        else list(indexable_values),
+        dtype=object,
     )
+    indexable_values = list(sorted(pd.unique(values[values.notnull()].astype(str).values)))
     include_pad = True
     #if include_pad:
     #    indexable_values = [-1] + indexable_values
@@ -40,8 +47,102 @@ def create_index_mapping_from_arrays(
     include_unkown: bool = True,
     include_none: bool = True,
 ) -> Dict[Any, int]:
-    all_values = set(str(value) for values in indexable_arrays for value in values)
-    return create_index_mapping(all_values, include_unkown, include_none)
+    all_values = pd.Series(
+        list(itertools.chain.from_iterable(indexable_arrays)), dtype=object
+    ).astype(str)
+    return create_index_mapping(all_values.values, include_unkown, include_none)
+
+
+# Kinds of keys an index mapping holds, each saved in an array of its own dtype
+_STR_KEY, _INT_KEY, _FLOAT_KEY, _NONE_KEY = range(4)
+
+
+def _key_kind(key: Any) -> int:
+    if isinstance(key, str):
+        return _STR_KEY
+    if isinstance(key, (int, np.integer)):
+        return _INT_KEY
+    if isinstance(key, (float, np.floating)):
+        return _FLOAT_KEY
+    if key is None:
+        return _NONE_KEY
+    raise TypeError("Unsupported index mapping key type: {}".format(type(key)))
+
+
+def save_index_mapping(path: str, index_mapping: Dict[str, Dict[Any, int]]) -> None:
+    # Typed arrays per column, so the file loads without pickle. The kinds array keeps the
+    # insertion order of the keys, which are split by type.
+    arrays = {}
+    for name, mapping in index_mapping.items():
+        keys = list(mapping.keys())
+        kinds = np.array([_key_kind(key) for key in keys], dtype=np.int8)
+        arrays["{}.kinds".format(name)] = kinds
+        arrays["{}.str_keys".format(name)] = np.array(
+            [key for key, kind in zip(keys, kinds) if kind == _STR_KEY], dtype=np.str_
+        )
+        arrays["{}.int_keys".format(name)] = np.array(
+            [key for key, kind in zip(keys, kinds) if kind == _INT_KEY], dtype=np.int64
+        )
+        arrays["{}.float_keys".format(name)] = np.array(
+            [key for key, kind in zip(keys, kinds) if kind == _FLOAT_KEY], dtype=np.float64
+        )
+        arrays["{}.values".format(name)] = np.fromiter(
+            mapping.values(), dtype=np.int64, count=len(mapping)
+        )
+    arrays["__defaultdict__"] = np.array(
+        [name for name, mapping in index_mapping.items() if isinstance(mapping, defaultdict)],
+        dtype=np.str_,
+    )
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+
+class _LazyIndexMapping(MutableMapping):
+    # Builds the dict of a column only when it's first accessed
+    def __init__(self, arrays: Dict[str, np.ndarray], defaultdict_names: Iterable[str]):
+        self._arrays = arrays
+        self._defaultdict_names = set(defaultdict_names)
+        self._mappings: Dict[str, Dict[Any, int]] = {}
+        self._names = [key[: -len(".kinds")] for key in arrays if key.endswith(".kinds")]
+
+    def _build(self, name: str) -> Dict[Any, int]:
+        typed_keys = {
+            _STR_KEY: iter(self._arrays["{}.str_keys".format(name)].tolist()),
+            _INT_KEY: iter(self._arrays["{}.int_keys".format(name)].tolist()),
+            _FLOAT_KEY: iter(self._arrays["{}.float_keys".format(name)].tolist()),
+            _NONE_KEY: itertools.repeat(None),
+        }
+        keys = [next(typed_keys[kind]) for kind in self._arrays["{}.kinds".format(name)].tolist()]
+        pairs = zip(keys, self._arrays["{}.values".format(name)].tolist())
+        return defaultdict(int, pairs) if name in self._defaultdict_names else dict(pairs)
+
+    def __getitem__(self, name: str) -> Dict[Any, int]:
+        if name not in self._mappings:
+            if name not in self._names:
+                raise KeyError(name)
+            self._mappings[name] = self._build(name)
+        return self._mappings[name]
+
+    def __setitem__(self, name: str, mapping: Dict[Any, int]) -> None:
+        if name not in self._names:
+            self._names.append(name)
+        self._mappings[name] = mapping
+
+    def __delitem__(self, name: str) -> None:
+        self._names.remove(name)
+        self._mappings.pop(name, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._names))
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+def load_index_mapping(path: str) -> MutableMapping:
+    with np.load(path, allow_pickle=False) as npz:
+        arrays = {key: npz[key] for key in npz.files}
+    return _LazyIndexMapping(arrays, arrays.pop("__defaultdict__").tolist())
 
 
 def map_array(values: list, mapping: dict) -> List[int]:
@@ -1,3 +1,4 @@
+import functools
 import importlib
 import inspect
 from typing import Type, TypeVar, Set
@@ -12,6 +13,7 @@ except ImportError:
 T = TypeVar("T")
 
 
+@functools.lru_cache(maxsize=None)
 def load_attr(attr_path: str, expected_type: Type[T]) -> T:
     splitted_path = attr_path.split(".")
     module_path = ".".join(splitted_path[:-1])
@@ -94,8 +94,20 @@ def parallel_literal_eval(
             return _parallel_literal_eval(series, p, use_tqdm)
 
 
+def _reject_json_constant(constant):
+    raise ValueError("{} is not a Python literal".format(constant))
+
+
 def literal_eval_if_str(element):
     if isinstance(element, str):
+        # Lists/dicts of numbers and double-quoted strings are valid JSON, and json's C parser
+        # is much faster than literal_eval. Only those take the JSON path, and NaN/Infinity are
+        # rejected so scalars like "null" or "NaN" keep failing as they do with literal_eval.
+        if element[:1] in ("[", "{"):
+            try:
+                return json.loads(element, parse_constant=_reject_json_constant)
+            except ValueError:
+                pass
         return ast.literal_eval(element)
     return element
 
@@ -17,3 +17,29 @@ test_base_training = ProjectConfig(
     output_column=Column("reward", IOType.NUMBER),
     recommender_type=RecommenderType.USER_BASED_COLLABORATIVE_FILTERING,
 )
+
+test_policy_estimator = ProjectConfig(
+    base_dir=os.path.join("tests", "output", "test"),
+    prepare_data_frames_task=UnitTestDataFrames,
+    dataset_class=InteractionsDataset,
+    user_column=Column("user", IOType.INDEXABLE),
+    item_column=Column("item", IOType.INDEXABLE),
+    other_input_columns=[Column("price", IOType.NUMBER)],
+    output_column=Column("reward", IOType.NUMBER),
+    item_is_input=False,
+)
+
+test_interactions = ProjectConfig(
+    base_dir=os.path.join("tests", "output", "test"),
+    prepare_data_frames_task=UnitTestDataFrames,
+    dataset_class=InteractionsDataset,
+    user_column=Column("user", IOType.INDEXABLE),
+    item_column=Column("item", IOType.INDEXABLE),
+    other_input_columns=[
+        Column("price", IOType.NUMBER),
+        Column("hist", IOType.INDEXABLE_ARRAY),
+        Column("features", IOType.FLOAT_ARRAY),
+    ],
+    output_column=Column("reward", IOType.NUMBER),
+    auxiliar_output_columns=[Column("click", IOType.INDEXABLE)],
+)
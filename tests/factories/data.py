@@ -37,3 +37,33 @@ class UnitTestDataFrames(BasePrepareDataFrames):
         df["n_items"] = len(self.read_data_frame().item.unique())
 
         return df
+
+
+def interactions_data_frame() -> pd.DataFrame:
+    # The columns of tests.factories.config.test_interactions, plus one it doesn't use
+    return pd.DataFrame(
+        {
+            "user": [1, 2, 3, 4, 5],
+            "item": [10, 11, 12, 13, 14],
+            "price": [1.5, 2.0, 0.5, 3.25, 1.0],
+            "hist": [[1, 2], [2, 3], [3, 4], [4, 5], [5, 6]],
+            "features": [[0.1, 0.2, 0.3]] * 5,
+            "reward": [1, 0, 1, 0, 1],
+            "click": [0, 1, 0, 1, 1],
+            "unused": ["a", "b", "c", "d", "e"],
+        }
+    )
+
+
+def assert_same_arrays(expected, actual) -> None:
+    # Compares the (possibly nested) tuples of arrays the datasets return, dtypes included
+    assert len(expected) == len(actual), (len(expected), len(actual))
+    for expected_array, actual_array in zip(expected, actual):
+        if isinstance(expected_array, tuple):
+            assert_same_arrays(expected_array, actual_array)
+        else:
+            assert expected_array.dtype == actual_array.dtype, (
+                expected_array.dtype,
+                actual_array.dtype,
+            )
+            np.testing.assert_array_equal(expected_array, actual_array)
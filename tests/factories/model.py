@@ -0,0 +1,19 @@
+import torch
+
+from mars_gym.model.policy_estimator import PolicyEstimator
+from tests.factories.config import test_policy_estimator
+
+index_mapping = {
+    "user": {str(i): i for i in range(1, 6)},
+    "item": {str(i): i for i in range(1, 8)},
+}
+
+
+def policy_estimator_inputs():
+    return [torch.tensor([1, 2, 3]), torch.tensor([0.5, 1.0, 2.0])]
+
+
+def create_policy_estimator(**kwargs) -> PolicyEstimator:
+    params = dict(embedding_dim=4, layers=[8, 6], sample_batch=policy_estimator_inputs())
+    params.update(kwargs)
+    return PolicyEstimator(test_policy_estimator, index_mapping, **params)
@@ -0,0 +1,84 @@
+import unittest
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from mars_gym.model.bandit import FixedPolicy, ModelPolicy, RandomPolicy
+
+
+class ArgminPolicy(ModelPolicy):
+    def _select_idx(
+        self,
+        arm_indices: List[int],
+        arm_contexts: Tuple[np.ndarray, ...],
+        arm_scores: List[float],
+        pos: int,
+    ) -> Union[int, Tuple[int, float]]:
+        return int(np.argmin(arm_scores))
+
+
+class TestRankBatch(unittest.TestCase):
+    def setUp(self):
+        self.arms_list = [["a", "b", "c", "d"], ["e", "f", "g", "h"], ["i", "j", "k"]]
+        self.arm_indices_list = [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11]]
+        self.arm_scores_list = [
+            [0.1, 0.9, 0.5, 0.9],
+            [1.0, 1.0, 1.0, 1.0],
+            [0.0, 0.3, 0.2],
+        ]
+
+    def _assert_rank_batch_matches_rank(self, policy):
+        for with_probs in [False, True]:
+            expected = [
+                policy.rank(
+                    arms, arm_indices, arm_scores=arm_scores, with_probs=with_probs
+                )
+                for arms, arm_indices, arm_scores in zip(
+                    self.arms_list, self.arm_indices_list, self.arm_scores_list
+                )
+            ]
+            if with_probs:
+                expected = (
+                    [result[0] for result in expected],
+                    [result[1] for result in expected],
+                )
+
+            actual = policy.rank_batch(
+                self.arms_list,
+                self.arm_indices_list,
+                [None] * len(self.arms_list),
+                self.arm_scores_list,
+                with_probs=with_probs,
+            )
+
+            self.assertEqual(expected, actual)
+
+    def test_random_policy(self):
+        policy = RandomPolicy(None)
+        self.assertTrue(policy._ranks_by_argmax())
+        self._assert_rank_batch_matches_rank(policy)
+
+    def test_fixed_policy(self):
+        policy = FixedPolicy(None)
+        self.assertTrue(policy._ranks_by_argmax())
+        self._assert_rank_batch_matches_rank(policy)
+
+    def test_model_policy(self):
+        policy = ModelPolicy(None)
+        self.assertTrue(policy._ranks_by_argmax())
+        self._assert_rank_batch_matches_rank(policy)
+
+    def test_subclass_overriding_select_idx_ranks_row_by_row(self):
+        policy = ArgminPolicy(None)
+        self.assertFalse(policy._ranks_by_argmax())
+        self._assert_rank_batch_matches_rank(policy)
+        self.assertEqual(
+            policy.rank_batch(
+                self.arms_list[:1], self.arm_indices_list[:1], [None], self.arm_scores_list[:1]
+            ),
+            [["a", "c", "b", "d"]],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
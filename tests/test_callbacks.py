@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+
+import torch
+import torch.nn as nn
+import torchbearer
+
+from mars_gym.torch.callbacks import InMemoryBest
+
+
+class TestInMemoryBest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = os.path.join(self.tmp_dir.name, "weights.pt")
+        self.module = nn.Linear(3, 2)
+        self.state = {torchbearer.MODEL: self.module, torchbearer.METRICS: {}}
+
+    def test_keeps_the_weights_of_the_last_save(self):
+        checkpoint = InMemoryBest(self.path, save_model_params_only=True)
+
+        checkpoint.save_checkpoint(self.state)
+        saved_weight = self.module.weight.detach().clone()
+        with torch.no_grad():
+            self.module.weight.add_(1.0)
+
+        self.assertTrue(torch.equal(checkpoint.best_state_dict["weight"], saved_weight))
+        self.assertTrue(
+            torch.equal(checkpoint.best_state_dict["weight"], torch.load(self.path)["weight"])
+        )
+
+    def test_updates_the_copy_in_place(self):
+        checkpoint = InMemoryBest(self.path, save_model_params_only=True)
+
+        checkpoint.save_checkpoint(self.state)
+        best_weight = checkpoint.best_state_dict["weight"]
+        with torch.no_grad():
+            self.module.weight.add_(1.0)
+        checkpoint.save_checkpoint(self.state)
+
+        self.assertIs(checkpoint.best_state_dict["weight"], best_weight)
+        self.assertTrue(torch.equal(best_weight, self.module.weight.detach()))
+        self.assertIsNot(best_weight, self.module.weight)
+
+
+if __name__ == "__main__":
+    unittest.main()
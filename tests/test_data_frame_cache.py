@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from mars_gym.data import dataset
+from mars_gym.data.dataset import read_csv_cached, read_parquet
+from tests.factories.config import test_interactions
+
+
+def _preprocess(data_frame: pd.DataFrame) -> pd.DataFrame:
+    data_frame["hist"] = [[int(v) for v in value.split("|")] for value in data_frame["hist"]]
+    return data_frame
+
+
+class TestDataFrameCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "data_frame_cache")
+        self.csv_path = os.path.join(self.tmp_dir.name, "interactions.csv")
+        pd.DataFrame({"user": [1, 2], "hist": ["1|2", "3"]}).to_csv(self.csv_path, index=False)
+        self.project_config = test_interactions
+        patcher = patch(
+            "mars_gym.data.dataset.get_data_frame_cache_path",
+            lambda key: os.path.join(self.cache_dir, "{}.parquet".format(key)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_read_parquet_decodes_list_columns_with_a_null_first_row(self):
+        path = os.path.join(self.tmp_dir.name, "lists.parquet")
+        pd.DataFrame({"hist": [None, [1, 2], [3]]}).to_parquet(path)
+
+        self.assertEqual(read_parquet(path)["hist"].tolist(), [None, [1, 2], [3]])
+
+    def test_reads_the_cache_written_on_the_first_read(self):
+        first = read_csv_cached(self.csv_path, _preprocess, self.project_config)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        with patch("mars_gym.data.dataset.read_csv") as read_csv:
+            second = read_csv_cached(self.csv_path, _preprocess, self.project_config)
+            read_csv.assert_not_called()
+
+        pd.testing.assert_frame_equal(first, second)
+        self.assertEqual(second["hist"].tolist(), [[1, 2], [3]])
+
+    def test_parses_again_when_the_cache_is_unreadable(self):
+        read_csv_cached(self.csv_path, _preprocess, self.project_config)
+        cache_path = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        with open(cache_path, "wb") as f:
+            f.write(b"not parquet")
+
+        with self.assertLogs("mars_gym.data.dataset", level="WARNING"):
+            data_frame = read_csv_cached(self.csv_path, _preprocess, self.project_config)
+
+        self.assertEqual(data_frame["hist"].tolist(), [[1, 2], [3]])
+
+    def test_evicts_the_least_recently_used_files_over_the_budget(self):
+        os.makedirs(self.cache_dir)
+        for i, name in enumerate(["old.parquet", "recent.parquet"]):
+            path = os.path.join(self.cache_dir, name)
+            with open(path, "wb") as f:
+                f.write(b"x" * 100)
+            os.utime(path, (i, i))
+
+        dataset._evict_data_frame_cache(self.cache_dir, 150)
+
+        self.assertEqual(os.listdir(self.cache_dir), ["recent.parquet"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mars_gym.tools.eval_viz.plot import (
+    UNKNOWN_ARM_COLOR,
+    _cumsum,
+    _downsample_indices,
+    _rolling_mean,
+    plot_exploration_arm,
+)
+
+
+class TestDownsampleIndices(unittest.TestCase):
+    def test_short_traces_are_kept_whole(self):
+        np.testing.assert_array_equal(_downsample_indices(5, n_out=10), np.arange(5))
+
+    def test_keeps_the_extremes_of_every_bucket(self):
+        rng = np.random.RandomState(0)
+        values = rng.rand(10000)
+        values[1234] = 10.0
+        values[8765] = -10.0
+
+        idx = _downsample_indices(len(values), n_out=100, values=values)
+
+        self.assertLessEqual(len(idx), 100)
+        self.assertEqual(idx[0], 0)
+        self.assertEqual(idx[-1], len(values) - 1)
+        self.assertIn(1234, idx)
+        self.assertIn(8765, idx)
+        self.assertTrue(np.all(np.diff(idx) > 0))
+
+    def test_keeps_the_extremes_of_every_stacked_trace(self):
+        values = np.zeros((2, 1000))
+        values[0, 100] = 1.0
+        values[1, 900] = 1.0
+
+        idx = _downsample_indices(1000, n_out=50, values=values)
+
+        self.assertIn(100, idx)
+        self.assertIn(900, idx)
+
+    def test_ignores_nans(self):
+        values = np.full(1000, np.nan)
+        values[500] = 1.0
+
+        idx = _downsample_indices(len(values), n_out=20, values=values)
+
+        self.assertIn(500, idx)
+
+
+class TestRollingMean(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.values = rng.rand(200)
+        self.values_with_nans = self.values.copy()
+        self.values_with_nans[rng.rand(200) < 0.3] = np.nan
+        self.values_with_nans[50:80] = np.nan
+        self.groups = rng.randint(0, 4, size=200)
+
+    def _expected(self, values, window, groups=None):
+        series = pd.Series(values)
+        if groups is None:
+            return series.rolling(window, min_periods=1).mean().values
+        return (
+            series.groupby(groups)
+            .transform(lambda v: v.rolling(window, min_periods=1).mean())
+            .values
+        )
+
+    def test_matches_pandas_rolling(self):
+        for window in [1, 5, 20, 500]:
+            np.testing.assert_allclose(
+                _rolling_mean(self.values, window), self._expected(self.values, window)
+            )
+
+    def test_matches_pandas_rolling_with_nans(self):
+        for window in [1, 5, 20]:
+            np.testing.assert_allclose(
+                _rolling_mean(self.values_with_nans, window),
+                self._expected(self.values_with_nans, window),
+            )
+
+    def test_matches_pandas_rolling_within_groups(self):
+        for values in [self.values, self.values_with_nans]:
+            for window in [1, 5, 20]:
+                np.testing.assert_allclose(
+                    _rolling_mean(values, window, self.groups),
+                    self._expected(values, window, self.groups),
+                )
+
+
+class TestCumsum(unittest.TestCase):
+    def test_matches_np_cumsum_within_groups(self):
+        rng = np.random.RandomState(0)
+        values = rng.rand(100)
+        values[[10, 55]] = np.nan
+        groups = rng.randint(0, 3, size=100)
+
+        expected = np.empty(len(values))
+        for group in np.unique(groups):
+            expected[groups == group] = np.cumsum(values[groups == group])
+
+        np.testing.assert_allclose(_cumsum(values, groups), expected)
+        np.testing.assert_allclose(_cumsum(values[:10]), np.cumsum(values[:10]))
+
+
+class TestPlotExplorationArm(unittest.TestCase):
+    def test_arms_missing_from_the_items_get_the_unknown_color(self):
+        df = pd.DataFrame({"item": ["a", "b", "z", "a", "z"], "idx": range(5)})
+
+        fig = plot_exploration_arm(df, all_items=["a", "b", "c"])
+
+        colors = {trace.name: trace.line.color for trace in fig.data}
+        self.assertEqual(colors["Arm z (unknown)"], UNKNOWN_ARM_COLOR)
+        self.assertNotEqual(colors["Arm a"], UNKNOWN_ARM_COLOR)
+        self.assertNotEqual(colors["Arm b"], UNKNOWN_ARM_COLOR)
+        self.assertNotEqual(colors["Arm a"], colors["Arm b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from collections import defaultdict
+
+import numpy as np
+
+from mars_gym.utils.index_mapping import (
+    create_index_mapping,
+    load_index_mapping,
+    save_index_mapping,
+)
+
+
+def _comparable_keys(mapping):
+    # nan != nan, so it's compared by its string form
+    return [
+        "nan" if isinstance(key, float) and np.isnan(key) else key for key in mapping.keys()
+    ]
+
+
+class TestIndexMapping(unittest.TestCase):
+    def _round_trip(self, index_mapping):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "index_mapping.npz")
+            save_index_mapping(path, index_mapping)
+            with np.load(path, allow_pickle=False) as arrays:
+                for key in arrays.files:
+                    self.assertNotEqual(arrays[key].dtype, object)
+            return load_index_mapping(path)
+
+    def test_round_trip_keeps_the_keys_values_and_order(self):
+        index_mapping = {
+            "item": create_index_mapping(["b", "a", "c", "a"]),
+            "user": create_index_mapping([3, 1, 2], include_none=False),
+            "position": {0: 0, 1: 1, 2.5: 2},
+        }
+
+        loaded = self._round_trip(index_mapping)
+
+        self.assertEqual(sorted(loaded.keys()), sorted(index_mapping.keys()))
+        for name, mapping in index_mapping.items():
+            self.assertEqual(_comparable_keys(loaded[name]), _comparable_keys(mapping))
+            self.assertEqual(list(loaded[name].values()), list(mapping.values()))
+        self.assertIsNone(list(loaded["item"].keys())[0])
+        self.assertEqual(loaded["item"]["-1"], 2)
+        self.assertEqual(loaded["item"]["a"], index_mapping["item"]["a"])
+
+    def test_round_trip_keeps_defaultdicts(self):
+        index_mapping = {
+            "item": create_index_mapping(["a", "b"]),
+            "user": create_index_mapping(["x", "y"], include_unkown=False),
+        }
+
+        loaded = self._round_trip(index_mapping)
+
+        self.assertIsInstance(loaded["item"], defaultdict)
+        self.assertEqual(loaded["item"]["unseen"], 0)
+        self.assertNotIsInstance(loaded["user"], defaultdict)
+        with self.assertRaises(KeyError):
+            loaded["user"]["unseen"]
+
+    def test_loaded_mapping_can_be_updated(self):
+        loaded = self._round_trip({"item": create_index_mapping(["a"])})
+
+        loaded.update({"user": {"x": 1}})
+        loaded["item"] = {"b": 1}
+
+        self.assertEqual(dict(loaded), {"item": {"b": 1}, "user": {"x": 1}})
+        with self.assertRaises(KeyError):
+            loaded["missing"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mars_gym.data.dataset import (
+    InteractionsDataset,
+    RowView,
+    _choose_except,
+    _rand_ints_except,
+)
+from mars_gym.meta_config import IOType
+from tests.factories.config import test_interactions
+from tests.factories.data import assert_same_arrays, interactions_data_frame
+
+
+def _reference_getitem(data_frame, project_config, indices):
+    # The row-wise construction InteractionsDataset had before it kept per-column arrays
+    def convert(value, type):
+        if type == IOType.INDEXABLE:
+            return value.astype(np.int64)
+        if type == IOType.NUMBER:
+            return value.astype(np.float64)
+        if type in (IOType.INT_ARRAY, IOType.INDEXABLE_ARRAY):
+            return np.array([np.array(v, dtype=np.int64) for v in value])
+        if type == IOType.FLOAT_ARRAY:
+            return np.array([np.array(v, dtype=np.float64) for v in value])
+        return value
+
+    if isinstance(indices, int):
+        indices = [indices]
+    rows = data_frame.iloc[indices]
+    inputs = tuple(
+        convert(rows[column.name].values, column.type)
+        for column in project_config.input_columns
+        if column.name in data_frame.columns
+    )
+    output = convert(
+        rows[project_config.output_column.name].values,
+        project_config.output_column.type,
+    )
+    if project_config.auxiliar_output_columns:
+        output = tuple([output]) + tuple(
+            convert(rows[column.name].values, column.type)
+            for column in project_config.auxiliar_output_columns
+        )
+    return inputs, output
+
+
+class TestInteractionsDataset(unittest.TestCase):
+    def setUp(self):
+        self.project_config = test_interactions
+        self.data_frame = interactions_data_frame()
+
+    def test_getitem_matches_the_row_wise_construction(self):
+        dataset = InteractionsDataset(
+            self.data_frame, None, self.project_config, index_mapping={}
+        )
+
+        self.assertEqual(len(dataset), len(self.data_frame))
+        for indices in [0, 3, [4, 0, 2], [1, 1], slice(None), slice(1, 4)]:
+            assert_same_arrays(
+                _reference_getitem(self.data_frame, self.project_config, indices),
+                dataset[indices],
+            )
+
+    def test_row_nbytes_is_estimated_from_the_column_arrays(self):
+        dataset = InteractionsDataset(
+            self.data_frame, None, self.project_config, index_mapping={}
+        )
+
+        self.assertEqual(
+            dataset.row_nbytes(),
+            sum(values.nbytes for values in dataset._soa.values()) // len(self.data_frame),
+        )
+        self.assertGreater(dataset.row_nbytes(), 0)
+
+    def test_does_not_keep_the_data_frame(self):
+        dataset = InteractionsDataset(
+            self.data_frame, None, self.project_config, index_mapping={}
+        )
+
+        self.assertFalse(hasattr(dataset, "_data_frame"))
+        self.assertNotIn("unused", dataset._soa)
+
+
+class TestRowView(unittest.TestCase):
+    def setUp(self):
+        self.data_frame = interactions_data_frame()
+        self.data_frame.index = self.data_frame.index * 10 + 10
+        self.data_frame.loc[20, "price"] = np.nan
+        self.data_frame.at[30, "hist"] = []
+        self.embeddings = {"a": np.ones(2)}
+
+    def test_matches_the_rows_of_the_data_frame(self):
+        rows = RowView.from_data_frame(self.data_frame)
+        records = self.data_frame.to_dict("records")
+
+        self.assertEqual(len(rows), len(self.data_frame))
+        for row, record, (_, series) in zip(rows, records, self.data_frame.iterrows()):
+            self.assertEqual(list(row), list(series.index))
+            self.assertEqual(len(row), len(series))
+            for key in series.index:
+                if isinstance(series[key], float) and np.isnan(series[key]):
+                    self.assertTrue(np.isnan(row[key]))
+                    self.assertTrue(np.isnan(record[key]))
+                else:
+                    self.assertEqual(row[key], series[key])
+                    self.assertEqual(row[key], record[key])
+            self.assertEqual(dict(row).keys(), record.keys())
+
+    def test_shared_values_are_added_once_to_every_row(self):
+        rows = RowView.from_data_frame(
+            self.data_frame, shared={"item_metadata": self.embeddings, "item": "shared"}
+        )
+
+        for row in rows:
+            self.assertEqual(list(row), list(self.data_frame.columns) + ["item_metadata"])
+            self.assertEqual(len(row), len(self.data_frame.columns) + 1)
+            self.assertIs(row["item_metadata"], self.embeddings)
+            self.assertEqual(row["item"], "shared")
+            self.assertEqual(row.get("missing"), None)
+            with self.assertRaises(KeyError):
+                row["missing"]
+
+
+class TestNegativeSampling(unittest.TestCase):
+    def test_rand_ints_except_never_returns_the_exceptions(self):
+        rng = np.random.default_rng(42)
+        exceptions = np.array([1, 2, 1, 3, 2, 1] * 100)
+
+        numbers = _rand_ints_except(rng, 1, 4, exceptions)
+
+        self.assertEqual(numbers.shape, exceptions.shape)
+        self.assertFalse(np.any(numbers == exceptions))
+        self.assertTrue(np.all((numbers >= 1) & (numbers < 4)))
+
+    def test_rand_ints_except_is_deterministic_for_a_seed(self):
+        exceptions = np.arange(1, 50)
+
+        first = _rand_ints_except(np.random.default_rng(7), 0, 10, exceptions)
+        second = _rand_ints_except(np.random.default_rng(7), 0, 10, exceptions)
+        other = _rand_ints_except(np.random.default_rng(8), 0, 10, exceptions)
+
+        np.testing.assert_array_equal(first, second)
+        self.assertFalse(np.array_equal(first, other))
+
+    def test_rand_ints_except_of_no_rows(self):
+        numbers = _rand_ints_except(np.random.default_rng(0), 0, 10, np.array([], dtype=np.int64))
+
+        self.assertEqual(numbers.shape, (0,))
+
+    def test_choose_except_never_returns_the_exception(self):
+        rng = np.random.default_rng(42)
+        values = [3, 5, 7]
+
+        chosen = [_choose_except(rng, values, 5) for _ in range(200)]
+
+        self.assertNotIn(5, chosen)
+        self.assertEqual(set(chosen), {3, 7})
+
+    def test_choose_except_is_deterministic_for_a_seed(self):
+        values = list(range(100))
+
+        first = [_choose_except(np.random.default_rng(3), values, 0) for _ in range(10)]
+        rng = np.random.default_rng(3)
+        second = [_choose_except(rng, values, 0) for _ in range(10)]
+        rng = np.random.default_rng(3)
+        third = [_choose_except(rng, values, 0) for _ in range(10)]
+
+        self.assertEqual(len(set(first)), 1)
+        self.assertEqual(second, third)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import io
+import unittest
+from collections import OrderedDict
+
+import torch
+
+from tests.factories.model import create_policy_estimator, policy_estimator_inputs
+
+
+class TestPolicyEstimator(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(42)
+        self.inputs = policy_estimator_inputs()
+
+    def _round_trip(self, state_dict) -> OrderedDict:
+        buffer = io.BytesIO()
+        torch.save(state_dict, buffer)
+        buffer.seek(0)
+        return torch.load(buffer)
+
+    def test_loads_a_checkpoint_saved_in_the_current_layout(self):
+        module = create_policy_estimator()
+        other_module = create_policy_estimator()
+
+        other_module.load_state_dict(self._round_trip(module.state_dict()))
+
+        self.assertTrue(torch.equal(other_module(*self.inputs), module(*self.inputs)))
+
+    def test_loads_a_checkpoint_saved_in_the_module_list_layout(self):
+        module = create_policy_estimator()
+
+        # The layout before the hidden layers became a Sequential: Linears at layers.0, layers.1
+        old_state_dict = OrderedDict()
+        for key, value in module.state_dict().items():
+            if key.startswith("layers."):
+                index, name = key[len("layers."):].split(".", 1)
+                key = "layers.{}.{}".format(int(index) // 2, name)
+            old_state_dict[key] = value
+        old_state_dict._metadata = OrderedDict(
+            (prefix, {"version": 1}) for prefix in module.state_dict()._metadata
+        )
+        self.assertIn("layers.1.weight", old_state_dict)
+
+        other_module = create_policy_estimator()
+        other_module.load_state_dict(self._round_trip(old_state_dict))
+
+        self.assertTrue(torch.equal(other_module(*self.inputs), module(*self.inputs)))
+
+
+if __name__ == "__main__":
+    unittest.main()
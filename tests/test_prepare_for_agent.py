@@ -0,0 +1,90 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mars_gym.data.dataset import InteractionsDataset
+from mars_gym.meta_config import ProjectConfig
+from mars_gym.simulation.training import SupervisedModelTraining
+from tests.factories.config import test_interactions
+from tests.factories.data import assert_same_arrays
+
+
+class _ObsBuilder(object):
+    _create_obs_data_frame = SupervisedModelTraining._create_obs_data_frame
+    _fill_hist_columns = SupervisedModelTraining._fill_hist_columns
+    _split_arm_contexts = SupervisedModelTraining._split_arm_contexts
+
+    def __init__(self, project_config: ProjectConfig):
+        self.project_config = project_config
+        self.obs_columns = [project_config.user_column.name] + [
+            column.name for column in project_config.other_input_columns
+        ]
+
+
+def _reference_obs_data_frame(builder, obs, arm_indices_list):
+    # The row-wise construction, one frame per observation, before the single column-wise frame
+    project_config = builder.project_config
+    item_column = project_config.item_column.name
+    ob_dfs = []
+    for ob, arm_indices in zip(obs, arm_indices_list):
+        data = [{**ob, item_column: arm_index} for arm_index in arm_indices]
+        ob_df = pd.DataFrame(columns=builder.obs_columns + [item_column], data=data)
+        ob_df = builder._fill_hist_columns(ob_df)
+        if project_config.output_column.name not in ob_df.columns:
+            ob_df[project_config.output_column.name] = 1
+        for auxiliar_output_column in project_config.auxiliar_output_columns:
+            if auxiliar_output_column.name not in ob_df.columns:
+                ob_df[auxiliar_output_column.name] = 0
+        ob_dfs.append(ob_df)
+    return pd.concat(ob_dfs, ignore_index=True)
+
+
+class TestPrepareForAgent(unittest.TestCase):
+    def setUp(self):
+        self.project_config = test_interactions
+        self.builder = _ObsBuilder(self.project_config)
+        self.obs = [
+            {"user": 1, "price": 1.5, "hist": [1, 2], "features": [0.1, 0.2], "other": "x"},
+            {"user": 2, "price": 0.5, "hist": [3, 4], "features": [0.3, 0.4]},
+            {"user": 3, "hist": [5, 6], "features": [0.5, 0.6]},
+        ]
+        self.arm_indices_list = [[4, 5, 6], [7], [8, 9]]
+
+    def _datasets(self, obs):
+        obs_df = self.builder._create_obs_data_frame(obs, self.arm_indices_list)
+        reference_df = _reference_obs_data_frame(self.builder, obs, self.arm_indices_list)
+        return obs_df, reference_df
+
+    def test_obs_data_frame_matches_the_row_wise_construction(self):
+        obs_df, reference_df = self._datasets(self.obs)
+
+        pd.testing.assert_frame_equal(obs_df, reference_df)
+
+    def _assert_split_matches_per_observation_slices(self, obs_df):
+        dataset = InteractionsDataset(obs_df, None, self.project_config, index_mapping={})
+        lengths = [len(arm_indices) for arm_indices in self.arm_indices_list]
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+
+        arm_contexts_list = self.builder._split_arm_contexts(dataset, starts, ends)
+
+        self.assertEqual(len(arm_contexts_list), len(self.obs))
+        for arm_contexts, start, end in zip(arm_contexts_list, starts, ends):
+            assert_same_arrays(dataset[start:end][0], tuple(arm_contexts))
+
+    def test_split_arm_contexts_matches_per_observation_slices(self):
+        obs_df, _ = self._datasets(self.obs)
+
+        self._assert_split_matches_per_observation_slices(obs_df)
+
+    def test_split_arm_contexts_with_ragged_array_inputs(self):
+        obs = [dict(ob) for ob in self.obs]
+        obs[1]["hist"] = [3]
+        obs_df, _ = self._datasets(obs)
+
+        self._assert_split_matches_per_observation_slices(obs_df)
+
+
+if __name__ == "__main__":
+    unittest.main()
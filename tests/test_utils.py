@@ -0,0 +1,30 @@
+import ast
+import unittest
+
+from mars_gym.utils.utils import literal_eval_if_str
+
+
+class TestLiteralEvalIfStr(unittest.TestCase):
+    def test_parses_lists_and_dicts_like_literal_eval(self):
+        for element in ['[1, 2, 3]', '[1.5, "a"]', '{"a": [1, 2]}', "[]", "['a', 'b']", "(1, 2)"]:
+            self.assertEqual(literal_eval_if_str(element), ast.literal_eval(element))
+
+    def test_scalars_keep_the_literal_eval_behaviour(self):
+        self.assertEqual(literal_eval_if_str("None"), None)
+        self.assertEqual(literal_eval_if_str("3"), 3)
+        for element in ["null", "NaN", "Infinity", "-Infinity", "true"]:
+            with self.assertRaises(ValueError):
+                literal_eval_if_str(element)
+
+    def test_json_constants_inside_lists_are_rejected(self):
+        for element in ["[NaN]", "[1, Infinity]"]:
+            with self.assertRaises(ValueError):
+                literal_eval_if_str(element)
+
+    def test_non_strings_are_returned_as_is(self):
+        element = [1, 2]
+        self.assertIs(literal_eval_if_str(element), element)
+
+
+if __name__ == "__main__":
+    unittest.main()